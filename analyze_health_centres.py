@@ -1,42 +1,227 @@
+import numpy as np
 import pandas as pd
 import os
+from collections import Counter
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
 
 FILE_PATH = "ogd_health_centres.csv"
 
-def analyze():
+# Files larger than this are streamed in chunks instead of loaded whole.
+STREAM_THRESHOLD = 100 * 1024 * 1024
+CHUNK_SIZE = 200_000
+TOP_N = 10
+PREVIEW_MAX_COLS = 10
+PREVIEW_MAX_COLWIDTH = 24
+
+# Basic analysis based on common OGD columns (adjust if needed), in
+# report order. Only these columns are parsed.
+REPORT_TITLES = {
+    "State": "Distribution by State:",
+    "Facility Type": "Distribution by Facility Type:",
+    "District": f"Top {TOP_N} Districts with most facilities:",
+}
+ANALYSIS_COLUMNS = tuple(REPORT_TITLES)
+
+# Columnar copy of the analysed columns, reused while newer than the CSV.
+CACHE_SUFFIX = ".parquet"
+
+
+def read_columns(path, usecols):
+    # The Arrow reader tokenizes on multiple threads; fall back to the C
+    # engine when pyarrow is not installed.
+    try:
+        return pd.read_csv(path, usecols=usecols, dtype="category", engine="pyarrow")
+    except ImportError:
+        return pd.read_csv(path, usecols=usecols, dtype="category")
+
+
+def load_columns(path, usecols):
+    cache = path + CACHE_SUFFIX
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        try:
+            return pd.read_parquet(cache, columns=usecols)
+        except (OSError, ValueError):
+            # A damaged or foreign sidecar is just a miss; rewrite it below.
+            pass
+
+    df = read_columns(path, usecols)
+    # Written beside the final path and renamed over it, so an interrupted
+    # run never leaves a partial sidecar that looks fresh.
+    partial = f"{cache}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(partial, compression="zstd")
+        os.replace(partial, cache)
+    except (ImportError, OSError):
+        # No parquet engine or a read-only directory; parse again next run.
+        if os.path.exists(partial):
+            os.remove(partial)
+    return df
+
+
+def bincount_columns(df, usecols):
+    # Bincount the categorical codes rather than hashing every value again.
+    counts = []
+    for col in usecols:
+        codes = df[col].cat.codes.to_numpy()
+        counts.append(np.bincount(codes[codes >= 0], minlength=len(df[col].cat.categories)))
+    return counts
+
+
+def top_counts(series, counts, n=TOP_N):
+    # Partition out the top n so only those n get sorted.
+    top = np.arange(len(counts))
+    if len(counts) > n:
+        top = np.argpartition(-counts, n)[:n]
+    top = top[np.argsort(-counts[top], kind="stable")]
+    index = pd.Index(series.cat.categories[top], name=series.name)
+    return pd.Series(counts[top], index=index, name="count")
+
+
+def counter_tops(counters):
+    return {
+        col: pd.Series(dict(counter.most_common(TOP_N)), name="count", dtype="int64")
+        .rename_axis(col)
+        for col, counter in counters.items()
+    }
+
+
+def arrow_stream_counts(path, usecols):
+    # Count each record batch with Arrow's multithreaded hash kernels; only
+    # the preview rows are ever converted to pandas.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    convert_options = pv.ConvertOptions(
+        include_columns=usecols,
+        column_types={col: dictionary for col in usecols},
+        strings_can_be_null=True,
+    )
+    rows = 0
+    preview = None
+    counters = {col: Counter() for col in usecols}
+    try:
+        for batch in pv.open_csv(path, convert_options=convert_options):
+            if preview is None:
+                preview = batch.slice(0, 5).to_pandas()
+            rows += batch.num_rows
+            for col, counter in counters.items():
+                counts = pc.value_counts(batch.column(col))
+                counter.update(
+                    dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()))
+                )
+    except pa.ArrowInvalid as e:
+        raise pd.errors.ParserError(str(e)) from e
+
+    for counter in counters.values():
+        counter.pop(None, None)
+    return rows, preview, counter_tops(counters)
+
+
+def stream_counts(path, usecols):
+    # Memory stays at one chunk plus the distinct keys per column.
+    try:
+        return arrow_stream_counts(path, usecols)
+    except ImportError:
+        pass
+
+    rows = 0
+    preview = None
+    counters = {col: Counter() for col in usecols}
+    reader = pd.read_csv(path, usecols=usecols, dtype="category", chunksize=CHUNK_SIZE)
+    for chunk in reader:
+        if preview is None:
+            preview = chunk.head()
+        rows += len(chunk)
+        for col, counter in counters.items():
+            counter.update(chunk[col].value_counts(sort=False).to_dict())
+
+    return rows, preview, counter_tops(counters)
+
+
+def polars_counts(path, usecols):
+    # Polars scans the file lazily and runs the row count, the preview and
+    # every group-by together on its own thread pool, streaming instead of
+    # building a frame of the whole file.
+    lf = pl.scan_csv(path, schema_overrides={col: pl.String for col in usecols}).select(usecols)
+    queries = [lf.select(pl.len()), lf.head(5)] + [
+        lf.filter(pl.col(col).is_not_null()).group_by(col).len().top_k(TOP_N, by="len")
+        for col in usecols
+    ]
+    try:
+        total, head, *tops = pl.collect_all(queries, engine="streaming")
+    except (pl.exceptions.ComputeError, pl.exceptions.NoDataError) as e:
+        raise pd.errors.ParserError(str(e)) from e
+
+    preview = pd.DataFrame(head.to_dict(as_series=False)).astype("category")
+    counts = {}
+    for col, top in zip(usecols, tops):
+        top = top.sort("len", descending=True)
+        index = pd.Index(top[col].to_list(), name=col)
+        counts[col] = pd.Series(top["len"].to_list(), index=index, name="count", dtype="int64")
+    return total.item(), preview, counts
+
+
+def analyze(source=FILE_PATH):
+    # source is a path or an open binary file, e.g. an io.BytesIO the
+    # caller already holds. Only paths get the Parquet cache and streaming.
     print("Running Health Centres Analysis...")
-    if not os.path.exists(FILE_PATH):
-        print(f"Error: {FILE_PATH} not found.")
-        return
-    
-    if os.path.getsize(FILE_PATH) == 0:
-        print(f"Warning: {FILE_PATH} is empty. Please add data to run analysis.")
-        return
+    is_path = isinstance(source, (str, os.PathLike))
+    if is_path:
+        source = os.fspath(source)
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            print(f"Error: {source} not found.")
+            return
+
+        if stat.st_size == 0:
+            print(f"Warning: {source} is empty. Please add data to run analysis.")
+            return
 
     try:
-        df = pd.read_csv(FILE_PATH)
-        print("\nDataset Overview:")
-        print(df.info())
-        print("\nFirst 5 rows:")
-        print(df.head())
-        
-        # Basic analysis based on common OGD columns (adjust if needed)
-        # Assuming columns like 'State', 'District', 'Facility Name', 'Facility Type'
-        
-        if 'State' in df.columns:
-            print("\nDistribution by State:")
-            print(df['State'].value_counts().head(10))
-            
-        if 'Facility Type' in df.columns:
-             print("\nDistribution by Facility Type:")
-             print(df['Facility Type'].value_counts().head(10))
-        
-        if 'District' in df.columns:
-            print("\nTop 10 Districts with most facilities:")
-            print(df['District'].value_counts().head(10))
-
-    except Exception as e:
+        header = pd.read_csv(source, nrows=0).columns
+        usecols = [col for col in ANALYSIS_COLUMNS if col in header]
+        if not usecols:
+            # An empty usecols would make some readers parse every column.
+            print(f"Warning: none of {', '.join(ANALYSIS_COLUMNS)} found; nothing to analyze.")
+            return
+
+        if is_path and pl is not None:
+            rows, preview, counts = polars_counts(source, usecols)
+        elif is_path and stat.st_size > STREAM_THRESHOLD:
+            rows, preview, counts = stream_counts(source, usecols)
+        else:
+            if is_path:
+                df = load_columns(source, usecols)
+            else:
+                source.seek(0)
+                df = read_columns(source, usecols)
+            rows, preview = len(df), df.head()
+            counts = {
+                col: top_counts(df[col], col_counts)
+                for col, col_counts in zip(usecols, bincount_columns(df, usecols))
+            }
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
         print(f"An error occurred during analysis: {e}")
+        return
+
+    # Shape and dtypes only; df.info() would also null-count every row.
+    print("\nDataset Overview:")
+    print(f"rows={rows} cols={len(usecols)}")
+    print(preview.dtypes)
+    print("\nFirst 5 rows:")
+    print(preview.to_string(max_cols=PREVIEW_MAX_COLS, max_colwidth=PREVIEW_MAX_COLWIDTH))
+
+    for col, title in REPORT_TITLES.items():
+        if col in counts:
+            print(f"\n{title}")
+            print(counts[col])
 
 if __name__ == "__main__":
     analyze()
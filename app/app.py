@@ -1,17 +1,21 @@
 import base64
 import csv
-import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, time, timedelta
 from functools import wraps
 from pathlib import Path
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from time import monotonic
 
+import orjson
+import requests
 from dotenv import load_dotenv
 from flask import (
     Flask,
     flash,
+    g,
+    has_request_context,
     jsonify,
     redirect,
     render_template,
@@ -19,19 +23,46 @@ from flask import (
     session,
     url_for,
 )
+from flask.json.provider import DefaultJSONProvider
 from flask_mail import Mail, Message
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from requests.adapters import HTTPAdapter
+from sqlalchemy import and_, case, event, func, or_, select, true
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload, raiseload, selectinload
+from sqlalchemy.schema import CreateIndex
 from werkzeug.security import check_password_hash, generate_password_hash
 
 load_dotenv()
 
 DATA_DIR = Path(__file__).resolve().parent / "data"
 
+class OrjsonProvider(DefaultJSONProvider):
+    # Same output as Flask's provider (sorted keys, HTTP dates via
+    # DefaultJSONProvider.default), encoded by orjson.
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        options = self.options | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options |= orjson.OPT_INDENT_2
+        body = orjson.dumps(obj, default=self.default, option=options)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
 app = Flask(
     __name__,
     instance_relative_config=True,
 )
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv("SECRET_KEY", "MYSECRETKEY")
 
 # Vercel filesystem is read-only, use /tmp for SQLite (Transient/Ephemeral only)
@@ -44,6 +75,10 @@ else:
 
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": 20, "max_overflow": 40}
+# Development/CI check: list queries raise on lazy loads and every response
+# reports how many statements it ran.
+app.config["RAISELOAD"] = os.getenv("APP_RAISELOAD") == "1"
 
 app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER")
 app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT") or 465)
@@ -56,6 +91,43 @@ app.config["MAIL_DEFAULT_SENDER"] = os.getenv("MAIL_DEFAULT_SENDER")
 mail = Mail(app)
 db = SQLAlchemy(app)
 
+# Shared keep-alive connections for Twilio and the AI API, so only the first
+# call per host pays for the TLS handshake.
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+SQLITE_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+]
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run while a request writes. The Vercel /tmp database
+    # keeps the default rollback journal.
+    cursor = dbapi_connection.cursor()
+    if not os.environ.get("VERCEL"):
+        cursor.execute("PRAGMA journal_mode=WAL")
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+if app.config["RAISELOAD"]:
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def count_queries(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get("query_count", 0) + 1
+
+    @app.after_request
+    def report_query_count(response):
+        response.headers["X-Query-Count"] = str(g.get("query_count", 0))
+        return response
+
 PRIORITY_SCORES = {
     "Emergency": 3,
     "High": 2,
@@ -63,14 +135,60 @@ PRIORITY_SCORES = {
     "Low": 0,
 }
 
+
+def priority_score_default(context):
+    # Filled from priority_level at insert time rather than generated by the
+    # database, so tables created before the score existed keep working.
+    level = context.get_current_parameters().get("priority_level")
+    return PRIORITY_SCORES.get(level, 1)
+
+
 AVAILABILITY_STATUSES = ["Available", "On Break", "Off Duty"]
+QUEUE_STATUSES = ["Waiting", "In Progress"]
+APPOINTMENT_STATUSES = frozenset({"Waiting", "In Progress", "Completed", "No Show"})
+FINISHED_STATUSES = frozenset({"Completed", "No Show"})
+PRIORITY_LEVELS = frozenset(PRIORITY_SCORES)
+TOKEN_ATTEMPTS = 3
+# scrypt runs in OpenSSL and costs a fraction of pbkdf2:sha256 at its default
+# 600k iterations. Existing pbkdf2 hashes still verify.
+PASSWORD_HASH_METHOD = "scrypt"
+
+CACHE_MAX_ENTRIES = 1024
+CROWD_STATUS_TTL = 30
+HELPDESK_REPLY_TTL = 15
+# Hospitals only change through the import script, which runs in its own
+# process, so the web workers also let these lookups expire.
+HOSPITAL_LOOKUP_TTL = 300
+SPECIALIZATIONS_TTL = 60
+NOTIFY_WORKERS = 8
 
 
 class Hospital(db.Model):
     __table_args__ = (
         db.Index("ix_hospital_name", "name"),
         db.Index("ix_hospital_state_district", "state", "district"),
+        db.Index("ix_hospital_name_nocase", db.text("name COLLATE NOCASE")),
+        # The typeahead filters on is_government by default; without it in
+        # the key SQLite prefers the state index and sorts every match.
+        db.Index("ix_hospital_gov_name_nocase", "is_government", db.text("name COLLATE NOCASE")),
+        db.Index(
+            "ix_hospital_gov_state_district",
+            "is_government",
+            db.text("state COLLATE NOCASE"),
+            db.text("district COLLATE NOCASE"),
+        ),
         db.UniqueConstraint("source", "source_id", name="uq_hospital_source_id"),
+        # One row per facility within a source; the importer relies on it to
+        # skip duplicates with ON CONFLICT DO NOTHING.
+        db.Index(
+            "uq_hospital_source_facility",
+            "source",
+            db.text("lower(coalesce(name, ''))"),
+            db.text("lower(coalesce(state, ''))"),
+            db.text("lower(coalesce(district, ''))"),
+            db.text("lower(coalesce(facility_type, ''))"),
+            unique=True,
+        ),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -91,6 +209,8 @@ class Hospital(db.Model):
 
 
 class User(db.Model):
+    __table_args__ = (db.Index("ix_user_role_hospital", "role", "hospital_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -120,6 +240,25 @@ class User(db.Model):
 
 
 class Appointment(db.Model):
+    __table_args__ = (
+        # Matches get_queue's filter and ORDER BY, so the queue is read in
+        # order straight from the index. Its (doctor_id, token_date) prefix
+        # also serves choose_doctor's join.
+        db.Index(
+            "ix_appt_queue",
+            "doctor_id",
+            "token_date",
+            db.text("priority_score DESC"),
+            "token_number",
+        ),
+        db.Index("ix_appt_status_date", "token_date", "status"),
+        db.Index("ix_appt_date_priority", "token_date", "priority_level", "created_at"),
+        db.Index("ix_appt_patient_created", "patient_id", "created_at"),
+        # An index rather than a table constraint so create_tables can add it
+        # to databases created before it existed.
+        db.Index("uq_appt_doctor_token", "doctor_id", "token_date", "token_number", unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -130,7 +269,7 @@ class Appointment(db.Model):
     scheduled_time = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default="Waiting")
     priority_level = db.Column(db.String(20), default="Normal")
-    priority_score = db.Column(db.Integer, default=1)
+    priority_score = db.Column(db.Integer, default=priority_score_default)
     symptoms = db.Column(db.Text)
 
     token_number = db.Column(db.Integer, nullable=False)
@@ -140,6 +279,10 @@ class Appointment(db.Model):
 
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index("ix_notification_user_unread", "user_id", "is_read", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     title = db.Column(db.String(120), nullable=False)
@@ -151,15 +294,32 @@ class Notification(db.Model):
 
 # ---------- Utilities ----------
 
+def is_unique_violation(error):
+    # Registration relies on the username/email UNIQUE constraints; any other
+    # IntegrityError is not a duplicate account.
+    return "UNIQUE constraint failed" in str(error.orig)
+
+
 def create_tables():
     with app.app_context():
         db.create_all()
+        # create_all skips tables that already exist, so indexes added to the
+        # models since the database was created are created here. SQLite
+        # reflection cannot see expression indexes, hence IF NOT EXISTS.
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                except IntegrityError:
+                    app.logger.warning("Existing rows violate %s; it was not created.", index.name)
 
 
 def seed_data():
     with app.app_context():
-        if not Hospital.query.first():
-            default_hospital = Hospital(
+        hospital = Hospital.query.first()
+        if not hospital:
+            hospital = Hospital(
                 name="City General Hospital",
                 address="Main Road",
                 state="",
@@ -167,77 +327,151 @@ def seed_data():
                 source="seed",
                 is_government=True,
             )
-            db.session.add(default_hospital)
-            db.session.commit()
-        # Create Admin
-        if not User.query.filter_by(role="admin").first():
-            admin_password = os.getenv("ADMIN_DEFAULT_PASSWORD", "admin123")
-            admin_user = User(
-                username="admin",
-                email="admin@hospital.local",
-                password_hash=generate_password_hash(admin_password, method="pbkdf2:sha256"),
-                role="admin",
-                full_name="Hospital Admin",
-                hospital_id=Hospital.query.first().id,
-                phone="9876543210"
-            )
-            db.session.add(admin_user)
+            db.session.add(hospital)
             db.session.commit()
 
-        # Create Doctors
         doctors_data = [
             {"username": "doctor1", "full_name": "Dr. Rohit Sharma", "spec": "Cardiologist", "phone": "9876543211"},
             {"username": "doctor2", "full_name": "Dr. Anjali Gupta", "spec": "Dermatologist", "phone": "9876543212"},
             {"username": "doctor3", "full_name": "Dr. Vikram Singh", "spec": "General Physician", "phone": "9876543213"},
         ]
-        
-        for doc in doctors_data:
-            if not User.query.filter_by(username=doc["username"]).first():
-                new_doc = User(
-                    username=doc["username"],
-                    email=f"{doc['username']}@hospital.local",
-                    password_hash=generate_password_hash("doctor123", method="pbkdf2:sha256"),
-                    role="doctor",
-                    full_name=doc["full_name"],
-                    type_of_doctor=doc["spec"],
-                    hospital_id=Hospital.query.first().id,
-                    phone=doc["phone"],
-                    daily_start_time="09:00",
-                    daily_end_time="17:00",
-                    slot_minutes=15
-                )
-                db.session.add(new_doc)
-        db.session.commit()
-
-        # Create Patients
         patients_data = [
             {"username": "patient1", "full_name": "Rahul Verma", "phone": "9876543221", "age": 30, "gender": "Male"},
             {"username": "patient2", "full_name": "Sneha Patel", "phone": "9876543222", "age": 25, "gender": "Female"},
         ]
+        usernames = [row["username"] for row in doctors_data + patients_data]
+        existing = {
+            username
+            for (username,) in db.session.query(User.username).filter(User.username.in_(usernames))
+        }
 
+        # Collect every missing user and insert them in one batch.
+        rows = []
+
+        # Create Admin
+        if not User.query.filter_by(role="admin").first():
+            admin_password = os.getenv("ADMIN_DEFAULT_PASSWORD", "admin123")
+            rows.append(
+                {
+                    "username": "admin",
+                    "email": "admin@hospital.local",
+                    "password_hash": generate_password_hash(admin_password, method=PASSWORD_HASH_METHOD),
+                    "role": "admin",
+                    "full_name": "Hospital Admin",
+                    "hospital_id": hospital.id,
+                    "phone": "9876543210",
+                }
+            )
+
+        # Create Doctors
+        for doc in doctors_data:
+            if doc["username"] not in existing:
+                rows.append(
+                    {
+                        "username": doc["username"],
+                        "email": f"{doc['username']}@hospital.local",
+                        "password_hash": generate_password_hash("doctor123", method=PASSWORD_HASH_METHOD),
+                        "role": "doctor",
+                        "full_name": doc["full_name"],
+                        "type_of_doctor": doc["spec"],
+                        "hospital_id": hospital.id,
+                        "phone": doc["phone"],
+                        "daily_start_time": "09:00",
+                        "daily_end_time": "17:00",
+                        "slot_minutes": 15,
+                    }
+                )
+
+        # Create Patients
         for pat in patients_data:
-            if not User.query.filter_by(username=pat["username"]).first():
-                new_pat = User(
-                    username=pat["username"],
-                    email=f"{pat['username']}@gmail.com",
-                    password_hash=generate_password_hash("patient123", method="pbkdf2:sha256"),
-                    role="patient",
-                    full_name=pat["full_name"],
-                    phone=pat["phone"],
-                    age=pat["age"],
-                    gender=pat["gender"],
-                    hospital_id=Hospital.query.first().id
+            if pat["username"] not in existing:
+                rows.append(
+                    {
+                        "username": pat["username"],
+                        "email": f"{pat['username']}@gmail.com",
+                        "password_hash": generate_password_hash("patient123", method=PASSWORD_HASH_METHOD),
+                        "role": "patient",
+                        "full_name": pat["full_name"],
+                        "phone": pat["phone"],
+                        "age": pat["age"],
+                        "gender": pat["gender"],
+                        "hospital_id": hospital.id,
+                    }
                 )
-                db.session.add(new_pat)
-        db.session.commit()
 
+        if rows:
+            db.session.execute(db.insert(User), rows)
+            db.session.commit()
 
-def current_user():
-    if "user_id" in session:
-        return User.query.get(session["user_id"])
+
+# Small per-process TTL cache. Each worker keeps its own copy, so a value is
+# never older than its timeout even when another worker changes the data.
+_cache = {}
+
+
+def cache_get(key):
+    entry = _cache.get(key)
+    if entry and entry[0] > monotonic():
+        return entry[1]
     return None
 
 
+def cache_set(key, value, timeout):
+    if len(_cache) >= CACHE_MAX_ENTRIES:
+        _cache.clear()
+    _cache[key] = (monotonic() + timeout, value)
+    return value
+
+
+def cache_delete(name):
+    for key in list(_cache):
+        if key[0] == name:
+            _cache.pop(key, None)
+
+
+def cached(timeout):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args):
+            key = (fn.__name__, *args)
+            value = cache_get(key)
+            if value is None:
+                value = cache_set(key, fn(*args), timeout)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_doctor_caches():
+    cache_delete("available_doctor_slots")
+    cache_delete("doctor_specializations")
+    invalidate_queue_caches()
+
+
+def invalidate_queue_caches():
+    # Queue, availability and doctor changes all feed the crowd status and
+    # the cached helpdesk replies built from it.
+    cache_delete("daily_crowd_status")
+    cache_delete("helpdesk_reply")
+
+
+def invalidate_hospital_caches():
+    cache_delete("hospital_states")
+    cache_delete("hospital_districts")
+
+
+def current_user():
+    if "user_id" not in session:
+        return None
+    # login_required, role_required and the view all ask for the user; load
+    # it once per request.
+    if "user" not in g:
+        g.user = db.session.get(User, session["user_id"])
+    return g.user
+
+
 def login_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -279,22 +513,92 @@ def generate_token(doctor_id, token_date):
     return (max_token or 0) + 1
 
 
+def list_options(*options):
+    if app.config["RAISELOAD"]:
+        return (*options, raiseload("*"))
+    return options
+
+
 def get_queue(doctor_id, token_date=None):
     token_date = token_date or date.today()
+    # Every list view shows the patient's name, so load them in one batch.
     return (
-        Appointment.query.filter_by(doctor_id=doctor_id, token_date=token_date)
-        .filter(Appointment.status.in_(["Waiting", "In Progress"]))
+        Appointment.query.options(*list_options(selectinload(Appointment.patient)))
+        .filter_by(doctor_id=doctor_id, token_date=token_date)
+        .filter(Appointment.status.in_(QUEUE_STATUSES))
         .order_by(Appointment.priority_score.desc(), Appointment.token_number.asc())
         .all()
     )
 
 
+def queue_length(doctor_id, token_date=None):
+    token_date = token_date or date.today()
+    return (
+        db.session.query(func.count(Appointment.id))
+        .filter_by(doctor_id=doctor_id, token_date=token_date)
+        .filter(Appointment.status.in_(QUEUE_STATUSES))
+        .scalar()
+    )
+
+
 def get_queue_position(appointment):
-    queue = get_queue(appointment.doctor_id, appointment.token_date)
-    for index, entry in enumerate(queue, start=1):
-        if entry.id == appointment.id:
-            return index
-    return None
+    if appointment.status not in QUEUE_STATUSES:
+        return None
+    # Count the active entries ordered ahead of this one in get_queue's order.
+    ahead = (
+        db.session.query(func.count(Appointment.id))
+        .filter_by(doctor_id=appointment.doctor_id, token_date=appointment.token_date)
+        .filter(Appointment.status.in_(QUEUE_STATUSES))
+        .filter(
+            or_(
+                Appointment.priority_score > appointment.priority_score,
+                and_(
+                    Appointment.priority_score == appointment.priority_score,
+                    Appointment.token_number < appointment.token_number,
+                ),
+            )
+        )
+        .scalar()
+    )
+    return ahead + 1
+
+
+def latest_queue_status(patient_id):
+    # The patient's latest appointment, its queue position (ranked the same
+    # way as get_queue_position) and the doctor's name and slot length, in
+    # a single statement.
+    ahead = aliased(Appointment)
+    rank = (
+        select(func.count(ahead.id) + 1)
+        .where(
+            ahead.doctor_id == Appointment.doctor_id,
+            ahead.token_date == Appointment.token_date,
+            ahead.status.in_(QUEUE_STATUSES),
+            or_(
+                ahead.priority_score > Appointment.priority_score,
+                and_(
+                    ahead.priority_score == Appointment.priority_score,
+                    ahead.token_number < Appointment.token_number,
+                ),
+            ),
+        )
+        .correlate(Appointment)
+        .scalar_subquery()
+    )
+    return (
+        db.session.query(
+            Appointment.token_number,
+            Appointment.status,
+            case((Appointment.status.in_(QUEUE_STATUSES), rank), else_=None).label("position"),
+            User.slot_minutes,
+            User.full_name,
+            User.username,
+        )
+        .join(User, User.id == Appointment.doctor_id)
+        .filter(Appointment.patient_id == patient_id)
+        .order_by(Appointment.created_at.desc())
+        .first()
+    )
 
 
 def estimate_wait_minutes(doctor, position):
@@ -332,18 +636,24 @@ def choose_doctor(specialization=None, hospital_id=None):
     if hospital_id:
         query = query.filter_by(hospital_id=hospital_id)
 
-    doctors = query.all()
-    if not doctors:
-        return None
-
-    scored = []
-    for doctor in doctors:
-        queue_len = len(get_queue(doctor.id))
-        availability_bonus = 0 if doctor.availability_status == "Available" else 5
-        scored.append((queue_len + availability_bonus, doctor))
-
-    scored.sort(key=lambda item: item[0])
-    return scored[0][1]
+    # Score every candidate in one grouped query: today's queue length plus
+    # a penalty for doctors who are not currently available.
+    score = func.count(Appointment.id) + case(
+        (User.availability_status == "Available", 0), else_=5
+    )
+    return (
+        query.outerjoin(
+            Appointment,
+            and_(
+                Appointment.doctor_id == User.id,
+                Appointment.token_date == date.today(),
+                Appointment.status.in_(QUEUE_STATUSES),
+            ),
+        )
+        .group_by(User.id)
+        .order_by(score, User.id)
+        .first()
+    )
 
 
 def send_email(subject, recipient, body):
@@ -358,34 +668,191 @@ def send_email(subject, recipient, body):
         return False
 
 
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER")
+TWILIO_ENABLED = bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER)
+TWILIO_URL = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
+TWILIO_HEADERS = {
+    "Authorization": "Basic "
+    + base64.b64encode(f"{TWILIO_ACCOUNT_SID}:{TWILIO_AUTH_TOKEN}".encode()).decode()
+}
+
+
 def send_sms(to_number, body):
-    sid = os.getenv("TWILIO_ACCOUNT_SID")
-    token = os.getenv("TWILIO_AUTH_TOKEN")
-    from_number = os.getenv("TWILIO_FROM_NUMBER")
-    if not (sid and token and from_number and to_number):
+    if not (TWILIO_ENABLED and to_number):
         return False
 
-    url = f"https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
-    payload = urlencode({"To": to_number, "From": from_number, "Body": body}).encode()
-    auth = base64.b64encode(f"{sid}:{token}".encode()).decode()
-    req = Request(url, data=payload, headers={"Authorization": f"Basic {auth}"})
+    payload = {"To": to_number, "From": TWILIO_FROM_NUMBER, "Body": body}
 
     try:
-        with urlopen(req, timeout=10) as response:
-            return 200 <= response.status < 300
+        response = http_session.post(TWILIO_URL, data=payload, headers=TWILIO_HEADERS, timeout=10)
+        return response.ok
     except Exception:
         return False
 
 
-def notify_user(user, title, message, send_email_flag=False, send_sms_flag=False):
-    notification = Notification(user_id=user.id, title=title, message=message)
-    db.session.add(notification)
+# Email and SMS go out on worker threads so the request only waits for the
+# notification row. Vercel may freeze the process once the response is sent,
+# so there they are still sent inline.
+notify_executor = ThreadPoolExecutor(max_workers=NOTIFY_WORKERS)
+
+
+def deliver_notification(title, message, email, phone):
+    with app.app_context():
+        if email:
+            send_email(title, email, message)
+        if phone:
+            send_sms(phone, message)
+
+
+def notify_users(users, title, message, send_email_flag=False, send_sms_flag=False):
+    # users only need id, email and phone, so projected rows work as well
+    # as User objects. All notification rows go in with one commit.
+    if not users:
+        return
+    db.session.execute(
+        db.insert(Notification),
+        [{"user_id": user.id, "title": title, "message": message} for user in users],
+    )
     db.session.commit()
 
-    if send_email_flag:
-        send_email(title, user.email, message)
-    if send_sms_flag and user.phone:
-        send_sms(user.phone, message)
+    for user in users:
+        email = user.email if send_email_flag else None
+        phone = user.phone if send_sms_flag else None
+        if not (email or phone):
+            continue
+        if os.environ.get("VERCEL"):
+            deliver_notification(title, message, email, phone)
+        else:
+            notify_executor.submit(deliver_notification, title, message, email, phone)
+
+
+def notify_user(user, title, message, send_email_flag=False, send_sms_flag=False):
+    notify_users([user], title, message, send_email_flag, send_sms_flag)
+
+
+APPOINTMENT_KEYWORDS = ("appointment", "book", "schedule")
+QUEUE_KEYWORDS = ("wait", "token", "queue", "status")
+AVAILABILITY_KEYWORDS = ("available", "doctor", "availability")
+EMERGENCY_KEYWORDS = ("emergency", "urgent")
+CROWD_KEYWORDS = ("crowd", "rush", "busy")
+
+# Intents in priority order: when a message mentions several, the first wins.
+HELPDESK_INTENTS = (
+    ("appointment", APPOINTMENT_KEYWORDS),
+    ("queue", QUEUE_KEYWORDS),
+    ("availability", AVAILABILITY_KEYWORDS),
+    ("emergency", EMERGENCY_KEYWORDS),
+    ("crowd", CROWD_KEYWORDS),
+)
+# One zero-width alternation finds every keyword occurrence in a single pass,
+# including keywords that overlap each other.
+HELPDESK_INTENT_PATTERN = re.compile(
+    "(?=" + "|".join(
+        f"(?P<{name}>{'|'.join(map(re.escape, keywords))})"
+        for name, keywords in HELPDESK_INTENTS
+    ) + ")"
+)
+
+HELPDESK_TRANSLATIONS = {
+    "hi": {
+        "default": "मैं अपॉइंटमेंट, क्यू स्टेटस और डॉक्टर उपलब्धता में मदद कर सकता हूँ।",
+        "appointment": "आप मरीज डैशबोर्ड से अपॉइंटमेंट बुक कर सकते हैं। मैं सबसे उपलब्ध डॉक्टर भी सुझा सकता हूँ।",
+        "queue": "अपने टोकन नंबर और अनुमानित प्रतीक्षा समय के लिए डैशबोर्ड देखें।",
+        "queue_dynamic": "आपका टोकन #{token} है, डॉक्टर {doctor} के साथ। आपकी कतार स्थिति {position} है। अनुमानित प्रतीक्षा: {wait_minutes} मिनट।",
+        "availability": "डैशबोर्ड पर डॉक्टर की उपलब्धता रियल‑टाइम में अपडेट होती है।",
+        "availability_dynamic": "डॉक्टर की उपलब्धता अभी {availability} है।",
+        "emergency": "यदि यह आपात स्थिति है, तो बुकिंग करते समय Emergency प्राथमिकता चुनें।",
+        "crowd": "भीड़ स्तर का अपडेट एडमिन डैशबोर्ड पर मिलता है।",
+        "crowd_dynamic": "अभी अस्पताल की भीड़ {crowd} है। कम भीड़ के समय आने की सलाह है।",
+    },
+    "mr": {
+        "default": "मी अपॉइंटमेंट, क्यू स्थिती आणि डॉक्टर उपलब्धता यामध्ये मदत करू शकतो.",
+        "appointment": "तुम्ही रुग्ण डॅशबोर्डवरून अपॉइंटमेंट बुक करू शकता. मी सर्वोत्तम उपलब्ध डॉक्टर सुचवू शकतो.",
+        "queue": "तुमचा टोकन नंबर आणि अंदाजे प्रतीक्षा वेळ डॅशबोर्डवर पाहा.",
+        "queue_dynamic": "तुमचा टोकन #{token} आहे, डॉक्टर {doctor} सोबत. तुमची क्यू स्थिती {position}. अंदाजे प्रतीक्षा: {wait_minutes} मिनिटे.",
+        "availability": "डॅशबोर्डवर डॉक्टरची उपलब्धता रिअल‑टाइममध्ये अपडेट होते.",
+        "availability_dynamic": "डॉक्टरची उपलब्धता सध्या {availability} आहे.",
+        "emergency": "आपत्कालीन परिस्थितीत बुकिंग करताना Emergency प्राधान्य निवडा.",
+        "crowd": "गर्दीची माहिती एडमिन डॅशबोर्डवर दिसते.",
+        "crowd_dynamic": "सध्या रुग्ण गर्दी {crowd} आहे. कमी गर्दीच्या वेळी येण्याची शिफारस.",
+    },
+    "ta": {
+        "default": "நியமனம், வரிசை நிலை மற்றும் மருத்துவர் கிடைப்பை நான் உதவ முடியும்.",
+        "appointment": "நீங்கள் நோயாளர் டாஷ்போர்டில் இருந்து நேரம் பதிவு செய்யலாம். சிறந்த கிடைக்கும் மருத்துவரையும் பரிந்துரைக்க முடியும்.",
+        "queue": "டோக்கன் எண் மற்றும் காத்திருக்கும் நேரத்தை டாஷ்போர்டில் பார்க்கவும்.",
+        "queue_dynamic": "உங்கள் டோக்கன் #{token}, மருத்துவர் {doctor} உடன். வரிசை நிலை {position}. காத்திருக்கும் நேரம்: {wait_minutes} நிமிடங்கள்.",
+        "availability": "மருத்துவர் கிடைப்புத் தகவல் டாஷ்போர்டில் நேரடியாக புதுப்பிக்கப்படுகிறது.",
+        "availability_dynamic": "மருத்துவர் கிடைப்புத் நிலை தற்போது {availability}.",
+        "emergency": "அவசர நிலைக்கு, பதிவு செய்யும்போது Emergency முன்னுரிமை தேர்வு செய்யவும்.",
+        "crowd": "கூட்ட நெரிசல் விவரம் நிர்வாக டாஷ்போர்டில் உள்ளது.",
+        "crowd_dynamic": "இப்போது மருத்துவமனை நெரிசல் {crowd}. குறைந்த நெரிசல் நேரத்தை தேர்வு செய்யவும்.",
+    },
+    "te": {
+        "default": "అపాయింట్‌మెంట్‌లు, క్యూస్థితి మరియు డాక్టర్ అందుబాటులో సహాయం చేయగలను.",
+        "appointment": "పేషెంట్ డ్యాష్‌బోర్డ్లో అపాయింట్‌మెంట్ బుక్ చేయవచ్చు. ఉత్తమ అందుబాటు డాక్టర్‌ను సూచించగలను.",
+        "queue": "టోకెన్ నంబర్ మరియు అంచనా వేచి ఉండే సమయాన్ని డ్యాష్‌బోర్డ్లో చూడండి.",
+        "queue_dynamic": "మీ టోకెన్ #{token}, డాక్టర్ {doctor}తో. క్యూలో మీ స్థానం {position}. అంచనా వేచి ఉండే సమయం: {wait_minutes} నిమిషాలు.",
+        "availability": "డాక్టర్ అందుబాటు డ్యాష్‌బోర్డ్లో రియల్‑టైమ్‌లో అప్డేట్ అవుతుంది.",
+        "availability_dynamic": "డాక్టర్ అందుబాటు ప్రస్తుతం {availability} గా ఉంది.",
+        "emergency": "ఎమర్జెన్సీ అయితే బుకింగ్ సమయంలో Emergency ప్రాధాన్యం ఎంచుకోండి.",
+        "crowd": "గుంపు సమాచారం అడ్మిన్ డ్యాష్‌బోర్డ్లో ఉంటుంది.",
+        "crowd_dynamic": "ప్రస్తుతం ఆసుపత్రి గుంపు స్థాయి {crowd}. తక్కువ గుంపు సమయంలో రావడం మంచిది.",
+    },
+    "bn": {
+        "default": "আমি অ্যাপয়েন্টমেন্ট, কিউ স্ট্যাটাস এবং ডাক্তার উপলভ্যতা নিয়ে সাহায্য করতে পারি।",
+        "appointment": "রোগী ড্যাশবোর্ড থেকে অ্যাপয়েন্টমেন্ট বুক করতে পারেন। আমি সেরা উপলভ্য ডাক্তারও সাজেস্ট করতে পারি।",
+        "queue": "টোকেন নম্বর এবং আনুমানিক অপেক্ষার সময় ড্যাশবোর্ডে দেখুন।",
+        "queue_dynamic": "আপনার টোকেন #{token}, ডাক্তার {doctor} এর সাথে। কিউ পজিশন {position}. আনুমানিক অপেক্ষা: {wait_minutes} মিনিট।",
+        "availability": "ডাক্তার উপলভ্যতা ড্যাশবোর্ডে রিয়েল‑টাইমে আপডেট হয়।",
+        "availability_dynamic": "ডাক্তার উপলভ্যতা বর্তমানে {availability}।",
+        "emergency": "জরুরি হলে বুকিংয়ের সময় Emergency প্রায়োরিটি নির্বাচন করুন।",
+        "crowd": "ভিড়ের তথ্য অ্যাডমিন ড্যাশবোর্ডে দেখা যায়।",
+        "crowd_dynamic": "এখন হাসপাতালের ভিড় {crowd}। কম ভিড়ের সময় আসার পরামর্শ।",
+    },
+    "gu": {
+        "default": "હું એપોઇન્ટમેન્ટ, ક્યુ સ્થિતિ અને ડોક્ટર ઉપલબ્ધતા વિશે મદદ કરી શકું છું.",
+        "appointment": "તમે પેશન્ટ ડૅશબોર્ડ પરથી એપોઇન્ટમેન્ટ બુક કરી શકો છો. હું શ્રેષ્ઠ ઉપલબ્ધ ડોક્ટર સૂચવી શકું છું.",
+        "queue": "તમારો ટોકન નંબર અને અંદાજિત રાહ સમય માટે ડૅશબોર્ડ જુઓ.",
+        "queue_dynamic": "તમારો ટોકન #{token} છે, ડોક્ટર {doctor} સાથે. ક્યુ સ્થિતિ {position}. અંદાજિત રાહ: {wait_minutes} મિનિટ.",
+        "availability": "ડોક્ટરની ઉપલબ્ધતા ડૅશબોર્ડ પર રિયલ‑ટાઈમ અપડેટ થાય છે.",
+        "availability_dynamic": "ડોક્ટરની ઉપલબ્ધતા હાલમાં {availability} છે.",
+        "emergency": "ઇમરજન્સી হলে બુકિંગ દરમિયાન Emergency પ્રાથમિકતા પસંદ કરો.",
+        "crowd": "ભીડની માહિતી એડમિન ડૅશબોર્ડ પર મળે છે.",
+        "crowd_dynamic": "હાલમાં હોસ્પિટલની ભીડ {crowd} છે. ઓછા ભીડવાળા સમયે આવવાનું સૂચન છે.",
+    },
+    "kn": {
+        "default": "ನಾನು ಅಪಾಯಿಂಟ್ಮೆಂಟ್, ಕ್ಯೂ ಸ್ಥಿತಿ ಮತ್ತು ವೈದ್ಯರ ಲಭ್ಯತೆಯಲ್ಲಿ ಸಹಾಯ ಮಾಡಬಹುದು.",
+        "appointment": "ನೀವು ರೋಗಿ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್‌ನಿಂದ ಅಪಾಯಿಂಟ್ಮೆಂಟ್ ಬುಕ್ ಮಾಡಬಹುದು. ಉತ್ತಮ ಲಭ್ಯ ವೈದ್ಯರನ್ನು ಸೂಚಿಸಬಹುದು.",
+        "queue": "ನಿಮ್ಮ ಟೋಕನ್ ಸಂಖ್ಯೆ ಮತ್ತು ಅಂದಾಜು ಕಾಯುವ ಸಮಯಕ್ಕೆ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್ ನೋಡಿ.",
+        "queue_dynamic": "ನಿಮ್ಮ ಟೋಕನ್ #{token}, ವೈದ್ಯ {doctor} ಜೊತೆ. ಕ್ಯೂ ಸ್ಥಾನ {position}. ಅಂದಾಜು ಕಾಯುವ ಸಮಯ: {wait_minutes} ನಿಮಿಷಗಳು.",
+        "availability": "ವೈದ್ಯರ ಲಭ್ಯತೆ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್‌ನಲ್ಲಿ ತಕ್ಷಣ ಅಪ್‌ಡೇಟ್ ಆಗುತ್ತದೆ.",
+        "availability_dynamic": "ವೈದ್ಯರ ಲಭ್ಯತೆ ಈಗ {availability} ಆಗಿದೆ.",
+        "emergency": "ಇದು ತುರ್ತುಸ್ಥಿತಿ হলে ಬುಕಿಂಗ್ ಸಮಯದಲ್ಲಿ Emergency ಪ್ರಾಥಮ್ಯ ಆಯ್ಕೆ ಮಾಡಿ.",
+        "crowd": "ಗುಂಪಿನ ಮಾಹಿತಿ ಆಡ್ಮಿನ್ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್‌ನಲ್ಲಿ ಲಭ್ಯ.",
+        "crowd_dynamic": "ಪ್ರಸ್ತುತ ಆಸ್ಪತ್ರೆಯ ಗುಂಪಿನ ಮಟ್ಟ {crowd}. ಕಡಿಮೆ ಗುಂಪಿನ ಸಮಯದಲ್ಲಿ ಬನ್ನಿ.",
+    },
+    "ml": {
+        "default": "അപ്പോയിന്റ്മെന്റ്, ക്യൂ നില, ഡോക്ടർ ലഭ്യത എന്നിവയിൽ ഞാൻ സഹായിക്കാം.",
+        "appointment": "പേഷ്യന്റ് ഡാഷ്‌ബോർഡിൽ നിന്ന് അപ്പോയിന്റ്മെന്റ് ബുക്ക് ചെയ്യാം. മികച്ച ലഭ്യമായ ഡോക്ടറെ നിർദേശിക്കാം.",
+        "queue": "നിങ്ങളുടെ ടോക്കൺ നമ്പറും കാത്തിരിപ്പ് സമയവും ഡാഷ്‌ബോർഡിൽ കാണുക.",
+        "queue_dynamic": "നിങ്ങളുടെ ടോക്കൺ #{token}, ഡോക്ടർ {doctor} കൂടെ. ക്യൂ സ്ഥാനമാണ് {position}. കാത്തിരിപ്പ്: {wait_minutes} മിനിറ്റ്.",
+        "availability": "ഡോക്ടറുടെ ലഭ്യത ഡാഷ്‌ബോർഡിൽ റിയൽ‑ടൈമിൽ അപ്‌ഡേറ്റ് ചെയ്യും.",
+        "availability_dynamic": "ഡോക്ടറുടെ ലഭ്യത ഇപ്പോൾ {availability} ആണ്.",
+        "emergency": "ഇത് അടിയന്തരമാണെങ്കിൽ ബുക്കിംഗ് സമയത്ത് Emergency മുൻഗണന തിരഞ്ഞെടുക്കുക.",
+        "crowd": "ജനക്കൂട്ട വിവരങ്ങൾ അഡ്മിൻ ഡാഷ്‌ബോർഡിൽ ലഭ്യമാണ്.",
+        "crowd_dynamic": "ഇപ്പോൾ ആശുപത്രിയിലെ തിരക്ക് {crowd}. തിരക്കുകുറഞ്ഞ സമയത്ത് വരിക.",
+    },
+}
+
+
+def detect_intent(normalized):
+    found = {match.lastgroup for match in HELPDESK_INTENT_PATTERN.finditer(normalized)}
+    for name, _ in HELPDESK_INTENTS:
+        if name in found:
+            return name
+    return None
 
 
 def rules_based_reply(message, language, context=None):
@@ -393,11 +860,12 @@ def rules_based_reply(message, language, context=None):
     context = context or {}
     response_key = "default"
     response_en = "I can help with appointments, queue status, and doctor availability."
+    intent = detect_intent(normalized)
 
-    if any(word in normalized for word in ["appointment", "book", "schedule"]):
+    if intent == "appointment":
         response_key = "appointment"
         response_en = "You can book an appointment from the patient dashboard. I can also suggest the best available doctor."
-    elif any(word in normalized for word in ["wait", "token", "queue", "status"]):
+    elif intent == "queue":
         token = context.get("token")
         position = context.get("position")
         wait_minutes = context.get("wait_minutes")
@@ -411,7 +879,7 @@ def rules_based_reply(message, language, context=None):
         else:
             response_key = "queue"
             response_en = "Check your dashboard to see your token number and estimated wait time."
-    elif any(word in normalized for word in ["available", "doctor", "availability"]):
+    elif intent == "availability":
         availability = context.get("doctor_availability")
         if availability:
             response_key = "availability_dynamic"
@@ -419,10 +887,10 @@ def rules_based_reply(message, language, context=None):
         else:
             response_key = "availability"
             response_en = "Doctor availability is updated in real time on the dashboard."
-    elif any(word in normalized for word in ["emergency", "urgent"]):
+    elif intent == "emergency":
         response_key = "emergency"
         response_en = "If this is an emergency, please select Emergency priority while booking so you are moved to the top of the queue."
-    elif any(word in normalized for word in ["crowd", "rush", "busy"]):
+    elif intent == "crowd":
         crowd = context.get("crowd_level")
         if crowd:
             response_key = "crowd_dynamic"
@@ -431,99 +899,8 @@ def rules_based_reply(message, language, context=None):
             response_key = "crowd"
             response_en = "Crowd level is monitored live on the admin dashboard."
 
-    translations = {
-        "hi": {
-            "default": "मैं अपॉइंटमेंट, क्यू स्टेटस और डॉक्टर उपलब्धता में मदद कर सकता हूँ।",
-            "appointment": "आप मरीज डैशबोर्ड से अपॉइंटमेंट बुक कर सकते हैं। मैं सबसे उपलब्ध डॉक्टर भी सुझा सकता हूँ।",
-            "queue": "अपने टोकन नंबर और अनुमानित प्रतीक्षा समय के लिए डैशबोर्ड देखें।",
-            "queue_dynamic": "आपका टोकन #{token} है, डॉक्टर {doctor} के साथ। आपकी कतार स्थिति {position} है। अनुमानित प्रतीक्षा: {wait_minutes} मिनट।",
-            "availability": "डैशबोर्ड पर डॉक्टर की उपलब्धता रियल‑टाइम में अपडेट होती है।",
-            "availability_dynamic": "डॉक्टर की उपलब्धता अभी {availability} है।",
-            "emergency": "यदि यह आपात स्थिति है, तो बुकिंग करते समय Emergency प्राथमिकता चुनें।",
-            "crowd": "भीड़ स्तर का अपडेट एडमिन डैशबोर्ड पर मिलता है।",
-            "crowd_dynamic": "अभी अस्पताल की भीड़ {crowd} है। कम भीड़ के समय आने की सलाह है।",
-        },
-        "mr": {
-            "default": "मी अपॉइंटमेंट, क्यू स्थिती आणि डॉक्टर उपलब्धता यामध्ये मदत करू शकतो.",
-            "appointment": "तुम्ही रुग्ण डॅशबोर्डवरून अपॉइंटमेंट बुक करू शकता. मी सर्वोत्तम उपलब्ध डॉक्टर सुचवू शकतो.",
-            "queue": "तुमचा टोकन नंबर आणि अंदाजे प्रतीक्षा वेळ डॅशबोर्डवर पाहा.",
-            "queue_dynamic": "तुमचा टोकन #{token} आहे, डॉक्टर {doctor} सोबत. तुमची क्यू स्थिती {position}. अंदाजे प्रतीक्षा: {wait_minutes} मिनिटे.",
-            "availability": "डॅशबोर्डवर डॉक्टरची उपलब्धता रिअल‑टाइममध्ये अपडेट होते.",
-            "availability_dynamic": "डॉक्टरची उपलब्धता सध्या {availability} आहे.",
-            "emergency": "आपत्कालीन परिस्थितीत बुकिंग करताना Emergency प्राधान्य निवडा.",
-            "crowd": "गर्दीची माहिती एडमिन डॅशबोर्डवर दिसते.",
-            "crowd_dynamic": "सध्या रुग्ण गर्दी {crowd} आहे. कमी गर्दीच्या वेळी येण्याची शिफारस.",
-        },
-        "ta": {
-            "default": "நியமனம், வரிசை நிலை மற்றும் மருத்துவர் கிடைப்பை நான் உதவ முடியும்.",
-            "appointment": "நீங்கள் நோயாளர் டாஷ்போர்டில் இருந்து நேரம் பதிவு செய்யலாம். சிறந்த கிடைக்கும் மருத்துவரையும் பரிந்துரைக்க முடியும்.",
-            "queue": "டோக்கன் எண் மற்றும் காத்திருக்கும் நேரத்தை டாஷ்போர்டில் பார்க்கவும்.",
-            "queue_dynamic": "உங்கள் டோக்கன் #{token}, மருத்துவர் {doctor} உடன். வரிசை நிலை {position}. காத்திருக்கும் நேரம்: {wait_minutes} நிமிடங்கள்.",
-            "availability": "மருத்துவர் கிடைப்புத் தகவல் டாஷ்போர்டில் நேரடியாக புதுப்பிக்கப்படுகிறது.",
-            "availability_dynamic": "மருத்துவர் கிடைப்புத் நிலை தற்போது {availability}.",
-            "emergency": "அவசர நிலைக்கு, பதிவு செய்யும்போது Emergency முன்னுரிமை தேர்வு செய்யவும்.",
-            "crowd": "கூட்ட நெரிசல் விவரம் நிர்வாக டாஷ்போர்டில் உள்ளது.",
-            "crowd_dynamic": "இப்போது மருத்துவமனை நெரிசல் {crowd}. குறைந்த நெரிசல் நேரத்தை தேர்வு செய்யவும்.",
-        },
-        "te": {
-            "default": "అపాయింట్‌మెంట్‌లు, క్యూస్థితి మరియు డాక్టర్ అందుబాటులో సహాయం చేయగలను.",
-            "appointment": "పేషెంట్ డ్యాష్‌బోర్డ్లో అపాయింట్‌మెంట్ బుక్ చేయవచ్చు. ఉత్తమ అందుబాటు డాక్టర్‌ను సూచించగలను.",
-            "queue": "టోకెన్ నంబర్ మరియు అంచనా వేచి ఉండే సమయాన్ని డ్యాష్‌బోర్డ్లో చూడండి.",
-            "queue_dynamic": "మీ టోకెన్ #{token}, డాక్టర్ {doctor}తో. క్యూలో మీ స్థానం {position}. అంచనా వేచి ఉండే సమయం: {wait_minutes} నిమిషాలు.",
-            "availability": "డాక్టర్ అందుబాటు డ్యాష్‌బోర్డ్లో రియల్‑టైమ్‌లో అప్డేట్ అవుతుంది.",
-            "availability_dynamic": "డాక్టర్ అందుబాటు ప్రస్తుతం {availability} గా ఉంది.",
-            "emergency": "ఎమర్జెన్సీ అయితే బుకింగ్ సమయంలో Emergency ప్రాధాన్యం ఎంచుకోండి.",
-            "crowd": "గుంపు సమాచారం అడ్మిన్ డ్యాష్‌బోర్డ్లో ఉంటుంది.",
-            "crowd_dynamic": "ప్రస్తుతం ఆసుపత్రి గుంపు స్థాయి {crowd}. తక్కువ గుంపు సమయంలో రావడం మంచిది.",
-        },
-        "bn": {
-            "default": "আমি অ্যাপয়েন্টমেন্ট, কিউ স্ট্যাটাস এবং ডাক্তার উপলভ্যতা নিয়ে সাহায্য করতে পারি।",
-            "appointment": "রোগী ড্যাশবোর্ড থেকে অ্যাপয়েন্টমেন্ট বুক করতে পারেন। আমি সেরা উপলভ্য ডাক্তারও সাজেস্ট করতে পারি।",
-            "queue": "টোকেন নম্বর এবং আনুমানিক অপেক্ষার সময় ড্যাশবোর্ডে দেখুন।",
-            "queue_dynamic": "আপনার টোকেন #{token}, ডাক্তার {doctor} এর সাথে। কিউ পজিশন {position}. আনুমানিক অপেক্ষা: {wait_minutes} মিনিট।",
-            "availability": "ডাক্তার উপলভ্যতা ড্যাশবোর্ডে রিয়েল‑টাইমে আপডেট হয়।",
-            "availability_dynamic": "ডাক্তার উপলভ্যতা বর্তমানে {availability}।",
-            "emergency": "জরুরি হলে বুকিংয়ের সময় Emergency প্রায়োরিটি নির্বাচন করুন।",
-            "crowd": "ভিড়ের তথ্য অ্যাডমিন ড্যাশবোর্ডে দেখা যায়।",
-            "crowd_dynamic": "এখন হাসপাতালের ভিড় {crowd}। কম ভিড়ের সময় আসার পরামর্শ।",
-        },
-        "gu": {
-            "default": "હું એપોઇન્ટમેન્ટ, ક્યુ સ્થિતિ અને ડોક્ટર ઉપલબ્ધતા વિશે મદદ કરી શકું છું.",
-            "appointment": "તમે પેશન્ટ ડૅશબોર્ડ પરથી એપોઇન્ટમેન્ટ બુક કરી શકો છો. હું શ્રેષ્ઠ ઉપલબ્ધ ડોક્ટર સૂચવી શકું છું.",
-            "queue": "તમારો ટોકન નંબર અને અંદાજિત રાહ સમય માટે ડૅશબોર્ડ જુઓ.",
-            "queue_dynamic": "તમારો ટોકન #{token} છે, ડોક્ટર {doctor} સાથે. ક્યુ સ્થિતિ {position}. અંદાજિત રાહ: {wait_minutes} મિનિટ.",
-            "availability": "ડોક્ટરની ઉપલબ્ધતા ડૅશબોર્ડ પર રિયલ‑ટાઈમ અપડેટ થાય છે.",
-            "availability_dynamic": "ડોક્ટરની ઉપલબ્ધતા હાલમાં {availability} છે.",
-            "emergency": "ઇમરજન્સી হলে બુકિંગ દરમિયાન Emergency પ્રાથમિકતા પસંદ કરો.",
-            "crowd": "ભીડની માહિતી એડમિન ડૅશબોર્ડ પર મળે છે.",
-            "crowd_dynamic": "હાલમાં હોસ્પિટલની ભીડ {crowd} છે. ઓછા ભીડવાળા સમયે આવવાનું સૂચન છે.",
-        },
-        "kn": {
-            "default": "ನಾನು ಅಪಾಯಿಂಟ್ಮೆಂಟ್, ಕ್ಯೂ ಸ್ಥಿತಿ ಮತ್ತು ವೈದ್ಯರ ಲಭ್ಯತೆಯಲ್ಲಿ ಸಹಾಯ ಮಾಡಬಹುದು.",
-            "appointment": "ನೀವು ರೋಗಿ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್‌ನಿಂದ ಅಪಾಯಿಂಟ್ಮೆಂಟ್ ಬುಕ್ ಮಾಡಬಹುದು. ಉತ್ತಮ ಲಭ್ಯ ವೈದ್ಯರನ್ನು ಸೂಚಿಸಬಹುದು.",
-            "queue": "ನಿಮ್ಮ ಟೋಕನ್ ಸಂಖ್ಯೆ ಮತ್ತು ಅಂದಾಜು ಕಾಯುವ ಸಮಯಕ್ಕೆ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್ ನೋಡಿ.",
-            "queue_dynamic": "ನಿಮ್ಮ ಟೋಕನ್ #{token}, ವೈದ್ಯ {doctor} ಜೊತೆ. ಕ್ಯೂ ಸ್ಥಾನ {position}. ಅಂದಾಜು ಕಾಯುವ ಸಮಯ: {wait_minutes} ನಿಮಿಷಗಳು.",
-            "availability": "ವೈದ್ಯರ ಲಭ್ಯತೆ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್‌ನಲ್ಲಿ ತಕ್ಷಣ ಅಪ್‌ಡೇಟ್ ಆಗುತ್ತದೆ.",
-            "availability_dynamic": "ವೈದ್ಯರ ಲಭ್ಯತೆ ಈಗ {availability} ಆಗಿದೆ.",
-            "emergency": "ಇದು ತುರ್ತುಸ್ಥಿತಿ হলে ಬುಕಿಂಗ್ ಸಮಯದಲ್ಲಿ Emergency ಪ್ರಾಥಮ್ಯ ಆಯ್ಕೆ ಮಾಡಿ.",
-            "crowd": "ಗುಂಪಿನ ಮಾಹಿತಿ ಆಡ್ಮಿನ್ ಡ್ಯಾಶ್‌ಬೋರ್ಡ್‌ನಲ್ಲಿ ಲಭ್ಯ.",
-            "crowd_dynamic": "ಪ್ರಸ್ತುತ ಆಸ್ಪತ್ರೆಯ ಗುಂಪಿನ ಮಟ್ಟ {crowd}. ಕಡಿಮೆ ಗುಂಪಿನ ಸಮಯದಲ್ಲಿ ಬನ್ನಿ.",
-        },
-        "ml": {
-            "default": "അപ്പോയിന്റ്മെന്റ്, ക്യൂ നില, ഡോക്ടർ ലഭ്യത എന്നിവയിൽ ഞാൻ സഹായിക്കാം.",
-            "appointment": "പേഷ്യന്റ് ഡാഷ്‌ബോർഡിൽ നിന്ന് അപ്പോയിന്റ്മെന്റ് ബുക്ക് ചെയ്യാം. മികച്ച ലഭ്യമായ ഡോക്ടറെ നിർദേശിക്കാം.",
-            "queue": "നിങ്ങളുടെ ടോക്കൺ നമ്പറും കാത്തിരിപ്പ് സമയവും ഡാഷ്‌ബോർഡിൽ കാണുക.",
-            "queue_dynamic": "നിങ്ങളുടെ ടോക്കൺ #{token}, ഡോക്ടർ {doctor} കൂടെ. ക്യൂ സ്ഥാനമാണ് {position}. കാത്തിരിപ്പ്: {wait_minutes} മിനിറ്റ്.",
-            "availability": "ഡോക്ടറുടെ ലഭ്യത ഡാഷ്‌ബോർഡിൽ റിയൽ‑ടൈമിൽ അപ്‌ഡേറ്റ് ചെയ്യും.",
-            "availability_dynamic": "ഡോക്ടറുടെ ലഭ്യത ഇപ്പോൾ {availability} ആണ്.",
-            "emergency": "ഇത് അടിയന്തരമാണെങ്കിൽ ബുക്കിംഗ് സമയത്ത് Emergency മുൻഗണന തിരഞ്ഞെടുക്കുക.",
-            "crowd": "ജനക്കൂട്ട വിവരങ്ങൾ അഡ്മിൻ ഡാഷ്‌ബോർഡിൽ ലഭ്യമാണ്.",
-            "crowd_dynamic": "ഇപ്പോൾ ആശുപത്രിയിലെ തിരക്ക് {crowd}. തിരക്കുകുറഞ്ഞ സമയത്ത് വരിക.",
-        },
-    }
-
-    if language in translations:
-        template = translations[language].get(response_key)
+    if language in HELPDESK_TRANSLATIONS:
+        template = HELPDESK_TRANSLATIONS[language].get(response_key)
         if template:
             return template.format(
                 token=context.get("token"),
@@ -537,10 +914,17 @@ def rules_based_reply(message, language, context=None):
     return response_en
 
 
+AI_API_URL = os.getenv("AI_API_URL")
+AI_API_KEY = os.getenv("AI_API_KEY")
+AI_ENABLED = bool(AI_API_URL and AI_API_KEY)
+AI_API_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {AI_API_KEY}",
+}
+
+
 def api_based_reply(message, language, context=None):
-    api_url = os.getenv("AI_API_URL")
-    api_key = os.getenv("AI_API_KEY")
-    if not (api_url and api_key):
+    if not AI_ENABLED:
         return None
 
     payload = {
@@ -548,19 +932,16 @@ def api_based_reply(message, language, context=None):
         "language": language,
         "context": context or "hospital_helpdesk",
     }
-    body = json.dumps(payload).encode()
-    req = Request(
-        api_url,
-        data=body,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        },
-    )
 
     try:
-        with urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode())
+        response = http_session.post(
+            AI_API_URL,
+            data=orjson.dumps(payload),
+            headers=AI_API_HEADERS,
+            timeout=10,
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
         if isinstance(data, dict):
             if "reply" in data:
                 return data["reply"]
@@ -576,27 +957,51 @@ def api_based_reply(message, language, context=None):
 
 
 def ai_reply(message, language, context=None):
-    api_reply = api_based_reply(message, language, context=context)
-    if api_reply:
-        return api_reply
+    if AI_ENABLED:
+        api_reply = api_based_reply(message, language, context=context)
+        if api_reply:
+            return api_reply
     return rules_based_reply(message, language, context=context)
 
 
-def compute_crowd_status():
-    today = date.today()
+@cached(CROWD_STATUS_TTL)
+def available_doctor_slots(hospital_id=None):
+    # The availability and registration routes drop this entry, but only in
+    # their own worker, so other workers rely on it expiring with the crowd
+    # status it feeds.
+    query = db.session.query(User.slot_minutes).filter_by(
+        role="doctor", availability_status="Available"
+    )
+    if hospital_id:
+        query = query.filter_by(hospital_id=hospital_id)
+    return tuple(row.slot_minutes for row in query.all())
+
+
+def hospital_appointments(hospital_id):
+    # Appointments belong to a hospital through their doctor.
+    if not hospital_id:
+        return true()
+    return Appointment.doctor_id.in_(select(User.id).where(User.hospital_id == hospital_id))
+
+
+def compute_crowd_status(hospital_id=None):
+    # Keyed by day so a cached entry never carries yesterday's queue past
+    # midnight. Admins see their own hospital; everyone else sees the counts
+    # across every hospital.
+    return daily_crowd_status(date.today(), hospital_id)
+
+
+@cached(CROWD_STATUS_TTL)
+def daily_crowd_status(today, hospital_id):
     queue_len = (
         Appointment.query.filter_by(token_date=today)
-        .filter(Appointment.status.in_(["Waiting", "In Progress"]))
+        .filter(Appointment.status.in_(QUEUE_STATUSES), hospital_appointments(hospital_id))
         .count()
     )
-    available_doctors = User.query.filter_by(role="doctor", availability_status="Available").count()
-
-    slot_minutes = (
-        db.session.query(func.avg(User.slot_minutes))
-        .filter_by(role="doctor", availability_status="Available")
-        .scalar()
-        or 10
-    )
+    slots = available_doctor_slots(hospital_id)
+    available_doctors = len(slots)
+    known_slots = [slot for slot in slots if slot is not None]
+    slot_minutes = sum(known_slots) / len(known_slots) if known_slots else 10
 
     capacity_per_hour = max(1, int(available_doctors * (60 / max(5, slot_minutes))))
     load_factor = queue_len / max(1, capacity_per_hour)
@@ -622,19 +1027,15 @@ def build_helpdesk_context(user):
     context = {"role": user.role}
 
     if user.role == "patient":
-        appointment = (
-            Appointment.query.filter_by(patient_id=user.id)
-            .order_by(Appointment.created_at.desc())
-            .first()
-        )
-        if appointment:
-            position = get_queue_position(appointment)
+        status = latest_queue_status(user.id)
+        if status:
             context.update(
                 {
-                    "token": appointment.token_number,
-                    "position": position,
-                    "wait_minutes": estimate_wait_minutes(appointment.doctor, position),
-                    "doctor_name": appointment.doctor.full_name or appointment.doctor.username,
+                    "token": status.token_number,
+                    "position": status.position,
+                    # The row carries the doctor's slot_minutes.
+                    "wait_minutes": estimate_wait_minutes(status, status.position),
+                    "doctor_name": status.full_name or status.username,
                 }
             )
 
@@ -642,12 +1043,12 @@ def build_helpdesk_context(user):
         context.update(
             {
                 "doctor_availability": user.availability_status,
-                "queue_len": len(get_queue(user.id)),
+                "queue_len": queue_length(user.id),
             }
         )
 
     if user.role == "admin":
-        crowd = compute_crowd_status()
+        crowd = compute_crowd_status(user.hospital_id)
         context.update(
             {
                 "crowd_level": crowd.get("level"),
@@ -658,6 +1059,17 @@ def build_helpdesk_context(user):
     return context
 
 
+def helpdesk_reply(user, message, language):
+    # Repeated questions within a few seconds reuse the reply instead of
+    # rebuilding the context and calling the AI API again.
+    key = ("helpdesk_reply", user.id, (message or "").lower().strip(), language)
+    reply = cache_get(key)
+    if reply is None:
+        context = build_helpdesk_context(user)
+        reply = cache_set(key, ai_reply(message, language, context=context), HELPDESK_REPLY_TTL)
+    return reply
+
+
 # ---------- Routes ----------
 
 @app.route("/")
@@ -698,6 +1110,10 @@ def register():
         language = request.form.get("language")
         hospital_id = request.form.get("hospital_id")
 
+        if not username or not email or not password:
+            flash("Username, email and password are required.", "error")
+            return render_template("patient-register.html")
+
         if not hospital_id:
             flash("Please select a hospital from the list.", "error")
             return render_template("patient-register.html")
@@ -706,14 +1122,10 @@ def register():
             flash("Please enter a valid mobile number for SMS alerts.", "error")
             return render_template("patient-register.html")
 
-        if User.query.filter((User.username == username) | (User.email == email)).first():
-            flash("Username or email already exists.", "error")
-            return render_template("patient-register.html")
-
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password, method="pbkdf2:sha256"),
+            password_hash=generate_password_hash(password, method=PASSWORD_HASH_METHOD),
             role="patient",
             full_name=full_name,
             phone=phone,
@@ -722,8 +1134,17 @@ def register():
             language=language or "en",
             hospital_id=int(hospital_id) if hospital_id else None,
         )
+        # username and email are unique, so the insert itself detects a
+        # duplicate without a separate lookup.
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_unique_violation(e):
+                raise
+            flash("Username or email already exists.", "error")
+            return render_template("patient-register.html")
         session["user_id"] = user.id
         return redirect(url_for("dashboard"))
 
@@ -745,8 +1166,8 @@ def doctor_register():
         daily_start_time = request.form.get("daily_start_time")
         daily_end_time = request.form.get("daily_end_time")
 
-        if User.query.filter((User.username == username) | (User.email == email)).first():
-            flash("Username or email already exists.", "error")
+        if not username or not email or not password:
+            flash("Username, email and password are required.", "error")
             return render_template("doctor-register.html")
 
         if not hospital_id:
@@ -760,7 +1181,7 @@ def doctor_register():
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password, method="pbkdf2:sha256"),
+            password_hash=generate_password_hash(password, method=PASSWORD_HASH_METHOD),
             role="doctor",
             full_name=full_name,
             phone=phone,
@@ -771,7 +1192,15 @@ def doctor_register():
             daily_end_time=daily_end_time or "17:00",
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_unique_violation(e):
+                raise
+            flash("Username or email already exists.", "error")
+            return render_template("doctor-register.html")
+        invalidate_doctor_caches()
         session["user_id"] = user.id
         return redirect(url_for("dashboard"))
 
@@ -795,8 +1224,8 @@ def admin_register():
         phone = request.form.get("phone")
         hospital_id = request.form.get("hospital_id")
 
-        if User.query.filter((User.username == username) | (User.email == email)).first():
-            flash("Username or email already exists.", "error")
+        if not username or not email or not password:
+            flash("Username, email and password are required.", "error")
             return render_template("admin-register.html")
 
         if not hospital_id:
@@ -810,14 +1239,21 @@ def admin_register():
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password, method="pbkdf2:sha256"),
+            password_hash=generate_password_hash(password, method=PASSWORD_HASH_METHOD),
             role="admin",
             full_name=full_name,
             phone=phone,
             hospital_id=int(hospital_id) if hospital_id else None,
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_unique_violation(e):
+                raise
+            flash("Username or email already exists.", "error")
+            return render_template("admin-register.html")
         session["user_id"] = user.id
         return redirect(url_for("dashboard"))
 
@@ -830,22 +1266,45 @@ def dashboard():
     user = current_user()
     if user.role == "admin":
         today = date.today()
-        total_patients = User.query.filter_by(role="patient").count()
-        total_doctors = User.query.filter_by(role="doctor").count()
-        today_appointments = Appointment.query.filter_by(token_date=today).count()
-        emergency_count = Appointment.query.filter_by(
-            token_date=today, priority_level="Emergency"
-        ).count()
+        # Admins manage their own hospital; one without a hospital still sees
+        # them all. Every count, list and the crowd status share the scope.
+        hospital_scope = User.hospital_id == user.hospital_id if user.hospital_id else true()
+        appointment_scope = hospital_appointments(user.hospital_id)
+        total_patients, total_doctors = (
+            db.session.query(
+                func.count().filter(User.role == "patient"),
+                func.count().filter(User.role == "doctor"),
+            )
+            .filter(hospital_scope)
+            .one()
+        )
+        today_appointments, emergency_count, waiting = (
+            db.session.query(
+                func.count(),
+                func.count().filter(Appointment.priority_level == "Emergency"),
+                func.count().filter(Appointment.status.in_(QUEUE_STATUSES)),
+            )
+            .filter(Appointment.token_date == today, appointment_scope)
+            .one()
+        )
         emergency_cases = (
-            Appointment.query.filter_by(token_date=today, priority_level="Emergency")
+            Appointment.query.options(
+                *list_options(selectinload(Appointment.patient), selectinload(Appointment.doctor))
+            )
+            .filter_by(token_date=today, priority_level="Emergency")
+            .filter(appointment_scope)
             .order_by(Appointment.created_at.desc())
             .all()
         )
-        waiting = Appointment.query.filter_by(token_date=today).filter(
-            Appointment.status.in_(["Waiting", "In Progress"])
-        ).count()
-        doctors = User.query.filter_by(role="doctor").all()
-        crowd_status = compute_crowd_status()
+        doctors = db.session.query(
+            User.id,
+            User.full_name,
+            User.username,
+            User.type_of_doctor,
+            User.availability_status,
+            User.availability_note,
+        ).filter(User.role == "doctor", hospital_scope).order_by(User.id.asc()).all()
+        crowd_status = compute_crowd_status(user.hospital_id)
 
         return render_template(
             "dashboard-admin.html",
@@ -871,7 +1330,8 @@ def dashboard():
         )
 
     upcoming = (
-        Appointment.query.filter_by(patient_id=user.id)
+        Appointment.query.options(*list_options(joinedload(Appointment.doctor)))
+        .filter_by(patient_id=user.id)
         .order_by(Appointment.created_at.desc())
         .first()
     )
@@ -889,19 +1349,36 @@ def dashboard():
     )
 
 
+@cached(SPECIALIZATIONS_TTL)
+def doctor_specializations():
+    rows = (
+        db.session.query(User.type_of_doctor)
+        .filter(User.role == "doctor", User.type_of_doctor.isnot(None), User.type_of_doctor != "")
+        .distinct()
+        .order_by(User.type_of_doctor.asc())
+        .all()
+    )
+    return [row.type_of_doctor for row in rows]
+
+
 @app.route("/book-appointment", methods=["GET", "POST"])
 @login_required
 @role_required("patient")
 def book_appointment():
     user = current_user()
-    doctors = User.query.filter_by(role="doctor").all()
-    specializations = sorted({doc.type_of_doctor for doc in doctors if doc.type_of_doctor})
+    specializations = doctor_specializations()
 
     if request.method == "POST":
         specialization = request.form.get("specialization")
         priority = request.form.get("priority", "Normal")
         symptoms = request.form.get("symptoms")
 
+        if priority not in PRIORITY_LEVELS:
+            flash("Invalid priority.", "error")
+            return render_template(
+                "appointment-book.html", user=user, specializations=specializations
+            )
+
         doctor = choose_doctor(specialization=specialization, hospital_id=user.hospital_id)
         if not doctor:
             flash("No doctor available for the selected specialization.", "error")
@@ -910,23 +1387,35 @@ def book_appointment():
             )
 
         token_date = date.today()
-        token_number = generate_token(doctor.id, token_date)
-        queue_position = len(get_queue(doctor.id, token_date)) + 1
+        queue_position = queue_length(doctor.id, token_date) + 1
         scheduled_time = compute_scheduled_time(doctor, queue_position)
 
-        appointment = Appointment(
-            patient_id=user.id,
-            doctor_id=doctor.id,
-            scheduled_time=scheduled_time,
-            status="Waiting",
-            priority_level=priority,
-            priority_score=PRIORITY_SCORES.get(priority, 1),
-            symptoms=symptoms,
-            token_number=token_number,
-            token_date=token_date,
-        )
-        db.session.add(appointment)
-        db.session.commit()
+        # Concurrent bookings can read the same MAX(token_number); the unique
+        # (doctor, date, token) index rejects the loser, which retries.
+        for _ in range(TOKEN_ATTEMPTS):
+            token_number = generate_token(doctor.id, token_date)
+            appointment = Appointment(
+                patient_id=user.id,
+                doctor_id=doctor.id,
+                scheduled_time=scheduled_time,
+                status="Waiting",
+                priority_level=priority,
+                symptoms=symptoms,
+                token_number=token_number,
+                token_date=token_date,
+            )
+            db.session.add(appointment)
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+        else:
+            flash("Could not assign a token. Please try again.", "error")
+            return render_template(
+                "appointment-book.html", user=user, specializations=specializations
+            )
+        invalidate_queue_caches()
 
         notify_user(
             user,
@@ -944,15 +1433,14 @@ def book_appointment():
         )
 
         if priority == "Emergency":
-            admins = User.query.filter_by(role="admin").all()
-            for admin in admins:
-                notify_user(
-                    admin,
-                    "Emergency Case Alert",
-                    f"Emergency case booked for Dr. {doctor.full_name or doctor.username}. Token #{token_number}.",
-                    send_email_flag=True,
-                    send_sms_flag=True,
-                )
+            admins = db.session.query(User.id, User.email, User.phone).filter_by(role="admin").all()
+            notify_users(
+                admins,
+                "Emergency Case Alert",
+                f"Emergency case booked for Dr. {doctor.full_name or doctor.username}. Token #{token_number}.",
+                send_email_flag=True,
+                send_sms_flag=True,
+            )
 
         return redirect(url_for("dashboard"))
 
@@ -977,6 +1465,7 @@ def update_availability():
     user.availability_note = note
     user.availability_updated_at = datetime.utcnow()
     db.session.commit()
+    invalidate_doctor_caches()
 
     flash("Availability updated.", "success")
     return redirect(url_for("dashboard"))
@@ -998,6 +1487,7 @@ def admin_update_availability(doctor_id):
     doctor.availability_note = note
     doctor.availability_updated_at = datetime.utcnow()
     db.session.commit()
+    invalidate_doctor_caches()
 
     notify_user(
         doctor,
@@ -1023,12 +1513,13 @@ def update_appointment_status(appointment_id):
         return redirect(url_for("dashboard"))
 
     new_status = request.form.get("status")
-    if new_status not in ["Waiting", "In Progress", "Completed", "No Show"]:
+    if new_status not in APPOINTMENT_STATUSES:
         flash("Invalid status.", "error")
         return redirect(url_for("dashboard"))
 
     appointment.status = new_status
     db.session.commit()
+    invalidate_queue_caches()
 
     notify_user(
         appointment.patient,
@@ -1038,7 +1529,7 @@ def update_appointment_status(appointment_id):
         send_sms_flag=True,
     )
 
-    if new_status in ["Completed", "No Show"]:
+    if new_status in FINISHED_STATUSES:
         queue = get_queue(user.id, appointment.token_date)
         if queue:
             next_patient = queue[0].patient
@@ -1059,7 +1550,8 @@ def update_appointment_status(appointment_id):
 def notifications():
     user = current_user()
     notifications_list = (
-        Notification.query.filter_by(user_id=user.id)
+        Notification.query.options(*list_options())
+        .filter_by(user_id=user.id)
         .order_by(Notification.created_at.desc())
         .limit(20)
         .all()
@@ -1077,8 +1569,7 @@ def helpdesk():
     if request.method == "POST":
         message = request.form.get("message")
         language = request.form.get("language", user.language or "en")
-        context = build_helpdesk_context(user)
-        response_text = ai_reply(message, language, context=context)
+        response_text = helpdesk_reply(user, message, language)
     return render_template(
         "helpdesk.html", user=user, response_text=response_text
     )
@@ -1099,6 +1590,17 @@ def api_helpdesk_public():
     return jsonify({"reply": reply})
 
 
+# The fields the hospital pickers show; rows serialize via _asdict().
+HOSPITAL_SUMMARY_COLUMNS = (
+    Hospital.id,
+    Hospital.name,
+    Hospital.state,
+    Hospital.district,
+    Hospital.facility_type,
+    Hospital.ownership,
+)
+
+
 @app.route("/api/hospitals")
 def api_hospitals():
     q = (request.args.get("q") or "").strip()
@@ -1107,38 +1609,30 @@ def api_hospitals():
     gov_only = request.args.get("gov_only", "1")
     limit = min(request.args.get("limit", 20, type=int) or 20, 50)
 
-    query = Hospital.query
+    query = db.session.query(*HOSPITAL_SUMMARY_COLUMNS)
     if gov_only != "0":
         query = query.filter(Hospital.is_government.is_(True))
     if state:
-        query = query.filter(func.lower(Hospital.state) == state.lower())
+        query = query.filter(Hospital.state.collate("NOCASE") == state)
     if district:
-        query = query.filter(func.lower(Hospital.district) == district.lower())
+        query = query.filter(Hospital.district.collate("NOCASE") == district)
     if q:
-        query = query.filter(func.lower(Hospital.name).like(f"{q.lower()}%"))
+        # SQLite's LIKE ignores ASCII case, so a bare column prefix match
+        # can seek ix_hospital_gov_name_nocase (or ix_hospital_name_nocase
+        # with gov_only=0) and read matches in name order.
+        query = query.filter(Hospital.name.like(f"{q}%")).order_by(
+            Hospital.name.collate("NOCASE").asc()
+        )
     else:
         query = query.order_by(Hospital.name.asc())
 
-    results = query.limit(limit).all()
-    data = [
-        {
-            "id": hospital.id,
-            "name": hospital.name,
-            "state": hospital.state,
-            "district": hospital.district,
-            "facility_type": hospital.facility_type,
-            "ownership": hospital.ownership,
-        }
-        for hospital in results
-    ]
-    return jsonify(data)
+    return jsonify([row._asdict() for row in query.limit(limit)])
 
 
-@app.route("/api/hospital-states")
-def api_hospital_states():
-    gov_only = request.args.get("gov_only", "1")
+@cached(HOSPITAL_LOOKUP_TTL)
+def hospital_states(gov_only):
     query = Hospital.query
-    if gov_only != "0":
+    if gov_only:
         query = query.filter(Hospital.is_government.is_(True))
 
     states = (
@@ -1149,19 +1643,16 @@ def api_hospital_states():
         .order_by(Hospital.state.asc())
         .all()
     )
-    return jsonify([state[0] for state in states])
+    return [state[0] for state in states]
 
 
-@app.route("/api/hospital-districts")
-def api_hospital_districts():
-    state = (request.args.get("state") or "").strip()
-    gov_only = request.args.get("gov_only", "1")
-
+@cached(HOSPITAL_LOOKUP_TTL)
+def hospital_districts(gov_only, state):
     query = Hospital.query
-    if gov_only != "0":
+    if gov_only:
         query = query.filter(Hospital.is_government.is_(True))
     if state:
-        query = query.filter(func.lower(Hospital.state) == state.lower())
+        query = query.filter(Hospital.state.collate("NOCASE") == state)
 
     districts = (
         query.with_entities(Hospital.district)
@@ -1171,7 +1662,20 @@ def api_hospital_districts():
         .order_by(Hospital.district.asc())
         .all()
     )
-    return jsonify([district[0] for district in districts])
+    return [district[0] for district in districts]
+
+
+@app.route("/api/hospital-states")
+def api_hospital_states():
+    gov_only = request.args.get("gov_only", "1")
+    return jsonify(hospital_states(gov_only != "0"))
+
+
+@app.route("/api/hospital-districts")
+def api_hospital_districts():
+    state = (request.args.get("state") or "").strip()
+    gov_only = request.args.get("gov_only", "1")
+    return jsonify(hospital_districts(gov_only != "0", state.lower()))
 
 
 @app.route("/api/hospital-list")
@@ -1181,38 +1685,24 @@ def api_hospital_list():
     gov_only = request.args.get("gov_only", "1")
     limit = min(request.args.get("limit", 200, type=int) or 200, 2000)
 
-    query = Hospital.query
+    query = db.session.query(*HOSPITAL_SUMMARY_COLUMNS)
     if gov_only != "0":
         query = query.filter(Hospital.is_government.is_(True))
     if state:
-        query = query.filter(func.lower(Hospital.state) == state.lower())
+        query = query.filter(Hospital.state.collate("NOCASE") == state)
     if district:
-        query = query.filter(func.lower(Hospital.district) == district.lower())
-
-    hospitals = (
-        query.order_by(Hospital.name.asc())
-        .limit(limit)
-        .all()
-    )
+        query = query.filter(Hospital.district.collate("NOCASE") == district)
 
-    data = [
-        {
-            "id": hospital.id,
-            "name": hospital.name,
-            "state": hospital.state,
-            "district": hospital.district,
-            "facility_type": hospital.facility_type,
-            "ownership": hospital.ownership,
-        }
-        for hospital in hospitals
-    ]
-    return jsonify(data)
+    hospitals = query.order_by(Hospital.name.asc()).limit(limit)
+    return jsonify([row._asdict() for row in hospitals])
 
 
 @app.route("/api/crowd-status")
 @login_required
 def api_crowd_status():
-    return jsonify(compute_crowd_status())
+    user = current_user()
+    hospital_id = user.hospital_id if user.role == "admin" else None
+    return jsonify(compute_crowd_status(hospital_id))
 
 
 @app.route("/api/queue")
@@ -1245,24 +1735,17 @@ def api_queue():
 @role_required("patient")
 def api_patient_status():
     user = current_user()
-    appointment = (
-        Appointment.query.filter_by(patient_id=user.id)
-        .order_by(Appointment.created_at.desc())
-        .first()
-    )
-    if not appointment:
+    status = latest_queue_status(user.id)
+    if not status:
         return jsonify({"status": "no_appointment"})
 
-    position = get_queue_position(appointment)
-    wait_minutes = estimate_wait_minutes(appointment.doctor, position)
-
     return jsonify(
         {
-            "token": appointment.token_number,
-            "position": position,
-            "wait_minutes": wait_minutes,
-            "doctor": appointment.doctor.full_name or appointment.doctor.username,
-            "status": appointment.status,
+            "token": status.token_number,
+            "position": status.position,
+            "wait_minutes": estimate_wait_minutes(status, status.position),
+            "doctor": status.full_name or status.username,
+            "status": status.status,
         }
     )
 
@@ -1272,7 +1755,8 @@ def api_patient_status():
 def api_notifications():
     user = current_user()
     notifications_list = (
-        Notification.query.filter_by(user_id=user.id, is_read=False)
+        Notification.query.options(*list_options())
+        .filter_by(user_id=user.id, is_read=False)
         .order_by(Notification.created_at.desc())
         .limit(5)
         .all()
@@ -1289,8 +1773,8 @@ def api_notifications():
 
 
 # Initialize DB for Vercel (or local run)
+create_tables()
 with app.app_context():
-    db.create_all()
     # Seed data only if tables are empty
     if not Hospital.query.first():
         seed_data()
@@ -1,7 +1,8 @@
 import csv
-import random
 from pathlib import Path
 
+import numpy as np
+
 STATES_AND_UTS = [
     "Andhra Pradesh",
     "Arunachal Pradesh",
@@ -55,39 +56,51 @@ INDIA_LAT_RANGE = (8.0, 37.5)
 INDIA_LON_RANGE = (68.0, 97.0)
 
 
-def random_pincode():
-    return str(random.randint(110000, 855999))
-
-
-def random_lat():
-    return round(random.uniform(*INDIA_LAT_RANGE), 6)
-
-
-def random_lon():
-    return round(random.uniform(*INDIA_LON_RANGE), 6)
+FIELDNAMES = [
+    "facility_name",
+    "address",
+    "state_name",
+    "district_name",
+    "sub_district_name",
+    "pincode",
+    "facility_type",
+    "ownership",
+    "facility_id",
+    "latitude",
+    "longitude",
+]
+FACILITIES_PER_DISTRICT = 5
 
 
 def generate_rows():
+    # Draw every random column in one call each, then index into them.
+    n_rows = len(STATES_AND_UTS) * len(DISTRICT_SUFFIXES) * FACILITIES_PER_DISTRICT
+    rng = np.random.default_rng()
+    subdistricts = rng.integers(0, len(SUBDISTRICTS), n_rows).tolist()
+    pincodes = rng.integers(110000, 855999, n_rows, endpoint=True).tolist()
+    lats = rng.uniform(*INDIA_LAT_RANGE, n_rows).round(6).tolist()
+    lons = rng.uniform(*INDIA_LON_RANGE, n_rows).round(6).tolist()
+
     counter = 1
     for state in STATES_AND_UTS:
         base = state.split()[0]
         for suffix in DISTRICT_SUFFIXES:
             district = f"{base} {suffix}"
-            for idx in range(1, 6):
-                facility_type = FACILITY_TYPES[(counter - 1) % len(FACILITY_TYPES)]
-                yield {
-                    "facility_name": f"Government {district} Hospital {idx}",
-                    "address": f"Main Road, {district}, {state}",
-                    "state_name": state,
-                    "district_name": district,
-                    "sub_district_name": random.choice(SUBDISTRICTS),
-                    "pincode": random_pincode(),
-                    "facility_type": facility_type,
-                    "ownership": "Government",
-                    "facility_id": f"GEN-{counter:05d}",
-                    "latitude": random_lat(),
-                    "longitude": random_lon(),
-                }
+            for idx in range(1, FACILITIES_PER_DISTRICT + 1):
+                row = counter - 1
+                yield [
+                    f"Government {district} Hospital {idx}",
+                    f"Main Road, {district}, {state}",
+                    state,
+                    district,
+                    SUBDISTRICTS[subdistricts[row]],
+                    str(pincodes[row]),
+                    FACILITY_TYPES[row % len(FACILITY_TYPES)],
+                    "Government",
+                    f"GEN-{counter:05d}",
+                    lats[row],
+                    lons[row],
+                ]
                 counter += 1
 
 
@@ -97,8 +110,8 @@ def main():
 
     rows = list(generate_rows())
     with output.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-        writer.writeheader()
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
         writer.writerows(rows)
 
     print(f"Generated {len(rows)} demo hospitals at {output}")
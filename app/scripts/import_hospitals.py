@@ -1,15 +1,41 @@
 import argparse
+import csv
 import sys
+from functools import lru_cache
 from pathlib import Path
 
-import pandas as pd
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(BASE_DIR))
 
-from app import app, db, Hospital
-
-
+from app import app, db, Hospital, invalidate_hospital_caches
+
+
+NAME_KEYS = ("facility_name", "health_facility_name", "hospital_name", "name", "facility", "hospital")
+ADDRESS_KEYS = ("address", "facility_address", "hospital_address", "location")
+STATE_KEYS = ("state_name", "state", "state_ut", "state_uts")
+DISTRICT_KEYS = ("district_name", "district", "districts")
+SUBDISTRICT_KEYS = ("sub_district_name", "subdistrict", "taluk", "block")
+PINCODE_KEYS = ("pincode", "pin_code", "pin", "postal_code", "zipcode")
+FACILITY_TYPE_KEYS = ("facility_type", "facility_category", "type", "hospital_type")
+OWNERSHIP_KEYS = ("ownership", "owner", "ownership_type", "ownership_category")
+SOURCE_ID_KEYS = ("facility_id", "health_facility_id", "hfr_id", "hospital_id", "nhrr_id")
+LATITUDE_KEYS = ("latitude", "lat", "geo_lat", "y")
+LONGITUDE_KEYS = ("longitude", "lon", "long", "geo_long", "x")
+# pandas' default NA tokens, lower-cased: the old pd.read_csv import turned
+# these into NaN, and the csv/openpyxl readers pass them through as text.
+MISSING_VALUES = frozenset({
+    "#n/a", "#n/a n/a", "#na", "-1.#ind", "-1.#qnan", "-nan", "1.#ind", "1.#qnan",
+    "<na>", "n/a", "na", "nan", "none", "null",
+})
+GOVERNMENT_TERMS = ("government", "govt", "public", "state")
+FACILITY_INDEX = "uq_hospital_source_facility"
+
+
+@lru_cache(maxsize=4096)
 def normalize_column(name: str) -> str:
     return (
         name.strip()
@@ -26,7 +52,7 @@ def first_value(row, keys):
         if value is None:
             continue
         text = str(value).strip()
-        if text and text.lower() not in {"nan", "none"}:
+        if text and text.lower() not in MISSING_VALUES:
             return text
     return None
 
@@ -39,48 +65,27 @@ def parse_float(value):
 
 
 def build_record(row, source):
-    name = first_value(
-        row,
-        [
-            "facility_name",
-            "health_facility_name",
-            "hospital_name",
-            "name",
-            "facility",
-            "hospital",
-        ],
-    )
+    name = first_value(row, NAME_KEYS)
     if not name:
         return None
 
-    address = first_value(
-        row,
-        [
-            "address",
-            "facility_address",
-            "hospital_address",
-            "location",
-        ],
-    )
-    state = first_value(row, ["state_name", "state", "state_ut", "state_uts"])
-    district = first_value(row, ["district_name", "district", "districts"])
-    subdistrict = first_value(row, ["sub_district_name", "subdistrict", "taluk", "block"])
-    pincode = first_value(row, ["pincode", "pin_code", "pin", "postal_code", "zipcode"])
-    facility_type = first_value(row, ["facility_type", "facility_category", "type", "hospital_type"])
-    ownership = first_value(row, ["ownership", "owner", "ownership_type", "ownership_category"])
-    source_id = first_value(
-        row,
-        ["facility_id", "health_facility_id", "hfr_id", "hospital_id", "nhrr_id"],
-    )
+    address = first_value(row, ADDRESS_KEYS)
+    state = first_value(row, STATE_KEYS)
+    district = first_value(row, DISTRICT_KEYS)
+    subdistrict = first_value(row, SUBDISTRICT_KEYS)
+    pincode = first_value(row, PINCODE_KEYS)
+    facility_type = first_value(row, FACILITY_TYPE_KEYS)
+    ownership = first_value(row, OWNERSHIP_KEYS)
+    source_id = first_value(row, SOURCE_ID_KEYS)
 
-    latitude = parse_float(first_value(row, ["latitude", "lat", "geo_lat", "y"]))
-    longitude = parse_float(first_value(row, ["longitude", "lon", "long", "geo_long", "x"]))
+    latitude = parse_float(first_value(row, LATITUDE_KEYS))
+    longitude = parse_float(first_value(row, LONGITUDE_KEYS))
 
     ownership_value = (ownership or "").lower()
     is_government = False
     if source in {"ogd", "generated"}:
         is_government = True
-    elif any(term in ownership_value for term in ["government", "govt", "public", "state"]):
+    elif any(term in ownership_value for term in GOVERNMENT_TERMS):
         is_government = True
 
     return {
@@ -100,54 +105,78 @@ def build_record(row, source):
     }
 
 
-def read_dataframe(path: Path) -> pd.DataFrame:
-    if path.suffix.lower() in {".xlsx", ".xls"}:
+def iter_rows(path: Path):
+    # Yield one dict per row keyed by normalized column names, without
+    # loading the whole file.
+    if path.suffix.lower() == ".xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [normalize_column(str(col or "")) for col in next(rows, ())]
+            for values in rows:
+                yield dict(zip(headers, values))
+        finally:
+            workbook.close()
+    elif path.suffix.lower() == ".xls":
+        import pandas as pd
+
         df = pd.read_excel(path, dtype=str)
+        df.columns = [normalize_column(col) for col in df.columns]
+        yield from df.to_dict("records")
     else:
-        df = pd.read_csv(path, dtype=str, low_memory=False)
-    df.columns = [normalize_column(col) for col in df.columns]
-    return df
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.reader(handle)
+            headers = [normalize_column(col) for col in next(reader, [])]
+            for values in reader:
+                yield dict(zip(headers, values))
 
 
 def import_files(files, source, replace):
     with app.app_context():
         db.create_all()
+        # Everything below, including the delete, runs in one transaction.
         if replace:
             Hospital.query.filter_by(source=source).delete()
-            db.session.commit()
 
-        seen = set()
+        # Duplicate facilities hit the unique index on the hospital table
+        # and are skipped by the database. create_all does not add indexes to
+        # an existing table, so make sure this one is there first; SQLite
+        # reflection cannot see expression indexes, hence IF NOT EXISTS.
+        facility_index = next(
+            index for index in Hospital.__table__.indexes
+            if index.name == FACILITY_INDEX
+        )
+        try:
+            db.session.execute(CreateIndex(facility_index, if_not_exists=True))
+        except IntegrityError:
+            raise SystemExit(
+                f"Existing hospitals contain duplicate facilities, so {FACILITY_INDEX} "
+                "cannot be created. Remove them or re-import their source with --replace."
+            )
+        # Only facility duplicates are skipped; a repeated source_id still fails.
+        insert_hospitals = insert(Hospital.__table__).on_conflict_do_nothing(
+            index_elements=facility_index.expressions
+        )
         buffer = []
         total = 0
 
         for file_path in files:
-            df = read_dataframe(file_path)
-            for _, row in df.iterrows():
+            for row in iter_rows(file_path):
                 record = build_record(row, source)
                 if not record:
                     continue
 
-                key = (
-                    (record["name"] or "").lower(),
-                    (record["state"] or "").lower(),
-                    (record["district"] or "").lower(),
-                    (record["facility_type"] or "").lower(),
-                )
-                if key in seen:
-                    continue
-                seen.add(key)
-
-                buffer.append(Hospital(**record))
+                buffer.append(record)
                 if len(buffer) >= 1000:
-                    db.session.add_all(buffer)
-                    db.session.commit()
-                    total += len(buffer)
+                    total += db.session.execute(insert_hospitals, buffer).rowcount
                     buffer.clear()
 
         if buffer:
-            db.session.add_all(buffer)
-            db.session.commit()
-            total += len(buffer)
+            total += db.session.execute(insert_hospitals, buffer).rowcount
+        db.session.commit()
+        invalidate_hospital_caches()
 
         print(f"Imported {total} records for source '{source}'.")
 
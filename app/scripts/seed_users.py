@@ -4,7 +4,7 @@ from itertools import cycle
 
 from werkzeug.security import generate_password_hash
 
-from app import app, db, Hospital, User
+from app import PASSWORD_HASH_METHOD, app, db, Hospital, User
 
 SPECIALIZATIONS = [
     "General Medicine",
@@ -19,6 +19,9 @@ SPECIALIZATIONS = [
 
 LANGUAGES = ["en", "hi", "mr", "ta", "te", "bn", "gu", "kn", "ml"]
 GENDERS = ["Male", "Female", "Other"]
+SEED_PREFIX = "seed_"
+# The first string after every "seed_..." username.
+SEED_PREFIX_END = SEED_PREFIX[:-1] + chr(ord(SEED_PREFIX[-1]) + 1)
 
 
 def seed_users(admins_per_hospital, doctors_per_hospital, patients_per_hospital, replace):
@@ -26,14 +29,25 @@ def seed_users(admins_per_hospital, doctors_per_hospital, patients_per_hospital,
         db.create_all()
 
         if replace:
-            User.query.filter(User.username.like("seed_%")).delete(synchronize_session=False)
+            # A range on the unique username index rather than LIKE, which
+            # ignores case in SQLite and treats "_" as a wildcard.
+            db.session.execute(
+                db.delete(User).where(User.username >= SEED_PREFIX, User.username < SEED_PREFIX_END),
+                execution_options={"synchronize_session": False},
+            )
             db.session.commit()
 
-        hospitals = Hospital.query.order_by(Hospital.id.asc()).all()
+        hospitals = db.session.query(Hospital.id, Hospital.name).order_by(Hospital.id.asc()).all()
         if not hospitals:
             print("No hospitals found. Import or generate hospitals first.")
             return
 
+        # Every seed user of a role shares the same demo password, so hash
+        # each one once instead of once per user.
+        admin_hash = generate_password_hash("Admin123", method=PASSWORD_HASH_METHOD)
+        doctor_hash = generate_password_hash("Doctor123", method=PASSWORD_HASH_METHOD)
+        patient_hash = generate_password_hash("Patient123", method=PASSWORD_HASH_METHOD)
+
         specialization_cycle = cycle(SPECIALIZATIONS)
         total_created = 0
         buffer = []
@@ -41,59 +55,62 @@ def seed_users(admins_per_hospital, doctors_per_hospital, patients_per_hospital,
 
         for hospital in hospitals:
             for idx in range(admins_per_hospital):
-                username = f"seed_admin_{hospital.id}_{idx}"
-                user = User(
-                    username=username,
-                    email=f"{username}@demo.local",
-                    password_hash=generate_password_hash("Admin123", method="pbkdf2:sha256"),
-                    role="admin",
-                    full_name=f"Admin {hospital.name}",
-                    phone=f"9{hospital.id:03d}{idx:02d}00000".ljust(10, "0")[:10],
-                    hospital_id=hospital.id,
+                username = f"{SEED_PREFIX}admin_{hospital.id}_{idx}"
+                buffer.append(
+                    {
+                        "username": username,
+                        "email": f"{username}@demo.local",
+                        "password_hash": admin_hash,
+                        "role": "admin",
+                        "full_name": f"Admin {hospital.name}",
+                        "phone": f"9{hospital.id:03d}{idx:02d}00000".ljust(10, "0")[:10],
+                        "hospital_id": hospital.id,
+                    }
                 )
-                buffer.append(user)
 
             for idx in range(doctors_per_hospital):
-                username = f"seed_doctor_{hospital.id}_{idx}"
-                user = User(
-                    username=username,
-                    email=f"{username}@demo.local",
-                    password_hash=generate_password_hash("Doctor123", method="pbkdf2:sha256"),
-                    role="doctor",
-                    full_name=f"Dr. {hospital.name} {idx + 1}",
-                    phone=f"8{hospital.id:03d}{idx:02d}00000".ljust(10, "0")[:10],
-                    hospital_id=hospital.id,
-                    type_of_doctor=next(specialization_cycle),
-                    slot_minutes=random.choice([10, 12, 15]),
-                    daily_start_time="09:00",
-                    daily_end_time="17:00",
+                username = f"{SEED_PREFIX}doctor_{hospital.id}_{idx}"
+                buffer.append(
+                    {
+                        "username": username,
+                        "email": f"{username}@demo.local",
+                        "password_hash": doctor_hash,
+                        "role": "doctor",
+                        "full_name": f"Dr. {hospital.name} {idx + 1}",
+                        "phone": f"8{hospital.id:03d}{idx:02d}00000".ljust(10, "0")[:10],
+                        "hospital_id": hospital.id,
+                        "type_of_doctor": next(specialization_cycle),
+                        "slot_minutes": random.choice([10, 12, 15]),
+                        "daily_start_time": "09:00",
+                        "daily_end_time": "17:00",
+                    }
                 )
-                buffer.append(user)
 
             for idx in range(patients_per_hospital):
-                username = f"seed_patient_{hospital.id}_{idx}"
-                user = User(
-                    username=username,
-                    email=f"{username}@demo.local",
-                    password_hash=generate_password_hash("Patient123", method="pbkdf2:sha256"),
-                    role="patient",
-                    full_name=f"Patient {hospital.name} {idx + 1}",
-                    phone=f"7{hospital.id:03d}{idx:03d}000".ljust(10, "0")[:10],
-                    age=random.randint(18, 70),
-                    gender=random.choice(GENDERS),
-                    language=random.choice(LANGUAGES),
-                    hospital_id=hospital.id,
+                username = f"{SEED_PREFIX}patient_{hospital.id}_{idx}"
+                buffer.append(
+                    {
+                        "username": username,
+                        "email": f"{username}@demo.local",
+                        "password_hash": patient_hash,
+                        "role": "patient",
+                        "full_name": f"Patient {hospital.name} {idx + 1}",
+                        "phone": f"7{hospital.id:03d}{idx:03d}000".ljust(10, "0")[:10],
+                        "age": random.randint(18, 70),
+                        "gender": random.choice(GENDERS),
+                        "language": random.choice(LANGUAGES),
+                        "hospital_id": hospital.id,
+                    }
                 )
-                buffer.append(user)
 
             if len(buffer) >= chunk_size:
-                db.session.bulk_save_objects(buffer)
+                db.session.execute(db.insert(User), buffer)
                 db.session.commit()
                 total_created += len(buffer)
                 buffer.clear()
 
         if buffer:
-            db.session.bulk_save_objects(buffer)
+            db.session.execute(db.insert(User), buffer)
             db.session.commit()
             total_created += len(buffer)
 
@@ -1,8 +1,27 @@
 from app.app import app, create_tables, seed_data
 import os
 
+GUNICORN_THREADS = 8
+
 if __name__ == "__main__":
     create_tables()
     seed_data()
     port = int(os.getenv("PORT", 5000))
+    if os.getenv("APP_ENV") == "production":
+        # gunicorn processes, each serving requests on a thread pool, instead
+        # of the single debug server. Every worker holds its own DB pool and
+        # notification threads, so containers should set WEB_CONCURRENCY to
+        # their CPU quota; the fallback counts the cores this process may use.
+        workers = os.getenv("WEB_CONCURRENCY") or str(len(os.sched_getaffinity(0)))
+        os.execvp(
+            "gunicorn",
+            [
+                "gunicorn",
+                "--worker-class", "gthread",
+                "--workers", workers,
+                "--threads", str(GUNICORN_THREADS),
+                "--bind", f"0.0.0.0:{port}",
+                "app.app:app",
+            ],
+        )
     app.run(debug=True, host="0.0.0.0", port=port)